@@ -0,0 +1,82 @@
+# File path: backend/category_cache.py
+import hashlib
+from sqlalchemy import text, bindparam, exc as sqlalchemy_exc
+from backend import db
+import logging
+
+# Get a logger instance for this module
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK_SIZE = 999 # Keeps each IN list under SQLite's default bound-parameter limit
+
+_SELECT_STMT = text("SELECT content_hash, category FROM category_cache WHERE content_hash IN :hashes").bindparams(
+    bindparam("hashes", expanding=True)
+)
+
+
+def content_hash(ticket_text, model, categories):
+    """
+    Cache key for one categorization: whitespace- and case-normalized text plus
+    the model and category list, so changing either never serves a stale answer.
+    """
+    normalized = " ".join(ticket_text.lower().split())
+    key = "\x1f".join((model, *categories, normalized))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _insert_statement(dialect_name):
+    """INSERT that keeps the existing row when the hash is already cached."""
+    insert_sql = """
+        INSERT INTO category_cache (content_hash, category, model)
+        VALUES (:content_hash, :category, :model)
+    """
+    if dialect_name in ('mysql', 'mariadb'):
+        return text(insert_sql + " ON DUPLICATE KEY UPDATE content_hash = content_hash")
+    if dialect_name in ('postgresql', 'sqlite'):
+        return text(insert_sql + " ON CONFLICT (content_hash) DO NOTHING")
+    return text(insert_sql)
+
+
+def get_many(hashes):
+    """
+    Returns {content_hash: category} for the given hashes that are cached,
+    using one IN query per LOOKUP_CHUNK_SIZE hashes. Returns {} on error.
+    """
+    if db.engine is None or not hashes:
+        return {}
+    hashes = list(dict.fromkeys(hashes))
+    try:
+        with db.connect() as conn:
+            cached = {}
+            for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+                result = conn.execute(_SELECT_STMT, {"hashes": hashes[start:start + LOOKUP_CHUNK_SIZE]})
+                cached.update(result.all())
+        logger.info(f"Category cache hits: {len(cached)}/{len(hashes)}")
+        return cached
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error reading category cache: {db_err}", exc_info=True)
+        return {}
+    except Exception as e:
+        logger.error(f"Unexpected error reading category cache: {e}", exc_info=True)
+        return {}
+
+
+def put_many(items, model):
+    """
+    Stores {content_hash: category} pairs in one executemany; existing hashes
+    are left as they are. Returns True on success, False on failure.
+    """
+    if db.engine is None or not items:
+        return False
+    rows = [{"content_hash": h, "category": category, "model": model} for h, category in items.items()]
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(_insert_statement(db.engine.dialect.name), rows)
+        logger.info(f"Stored {len(rows)} categories in the category cache.")
+        return True
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error writing category cache: {db_err}", exc_info=True)
+        return False
+    except Exception as e:
+        logger.error(f"Unexpected error writing category cache: {e}", exc_info=True)
+        return False
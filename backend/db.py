@@ -1,10 +1,19 @@
 # File path: backend/db.py
+import io
 import os
-import pandas as pd
-from sqlalchemy import create_engine, text, exc as sqlalchemy_exc
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, make_url, text, bindparam, exc as sqlalchemy_exc
 from dotenv import load_dotenv
 import logging
 
+try:
+    import connectorx as cx # Optional: reads query results straight into Arrow buffers
+except ImportError:
+    cx = None
+
 # Get a logger instance for this module
 logger = logging.getLogger(__name__)
 
@@ -14,12 +23,34 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 engine = None # Initialize engine to None
 
+def _configure_sqlite_connection(dbapi_conn, connection_record):
+    """
+    SQLite only: WAL lets readers (e.g. the dashboard) run during an ingestion
+    write transaction, and synchronous=NORMAL, which is durable in WAL mode,
+    syncs at checkpoints instead of on every commit.
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
+
 if not DATABASE_URL:
     logger.critical("DATABASE_URL environment variable not set!")
     # engine remains None
 else:
     try:
-        engine = create_engine(DATABASE_URL)
+        engine = create_engine(
+            DATABASE_URL,
+            pool_size=20,        # Connections kept open for concurrent ingestion/reads
+            max_overflow=10,     # Extra connections allowed under burst load
+            pool_recycle=3600,   # Recycle before the server's idle timeout drops them
+            pool_pre_ping=True,  # Transparently replace stale connections after DB restarts
+            query_cache_size=1200, # Compiled-statement LRU size (default 500)
+        )
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, "connect", _configure_sqlite_connection)
         # Test connection on creation
         with engine.connect() as conn:
              logger.info("Database engine created and connection tested successfully.")
@@ -33,52 +64,303 @@ else:
         logger.critical(f"Failed to create database engine due to an unexpected error: {e}", exc_info=True)
         engine = None
 
+# --- Per-Request Connection Reuse ---
+# Connection opened by the innermost active db_conn() block, if any
+_active_conn = ContextVar("active_db_conn", default=None)
+
+@contextmanager
+def db_conn():
+    """
+    Holds one pooled connection for a unit of work (e.g. one chat turn), so
+    read helpers called inside the block share it instead of each checking
+    out their own. Nested blocks reuse the outer connection.
+    Yields None when the engine is not available.
+    """
+    conn = _active_conn.get()
+    if conn is not None or engine is None:
+        yield conn
+        return
+    with engine.connect() as conn:
+        token = _active_conn.set(conn)
+        try:
+            yield conn
+        finally:
+            _active_conn.reset(token)
+
+def connect():
+    """
+    Context manager for a read connection: the one held by an active db_conn()
+    block (left open for the rest of the block), else a new pooled connection.
+    """
+    conn = _active_conn.get()
+    if conn is not None:
+        return nullcontext(conn)
+    return engine.connect()
+
 # --- Database Functions ---
 
-def get_tickets_df():
+READ_CHUNK_SIZE = 10_000 # Rows fetched per server-side cursor batch
+TICKETS_CACHE_TTL_SECONDS = 30
+# Past the TTL, a cached read is revalidated with get_tickets_fingerprint()
+# instead of re-read, for at most this long: the probe cannot see in-place
+# UPDATEs (e.g. categorization writing back categories) from other processes.
+TICKETS_CACHE_MAX_AGE_SECONDS = int(os.getenv("TICKETS_CACHE_MAX_AGE_SECONDS", "300"))
+
+TICKETS_CACHE_MAX_ENTRIES = 4 # Distinct (since, columns) reads kept at once
+
+# {(since, columns): (fetched_at, validated_at, fingerprint, DataFrame)} for
+# recent successful get_tickets_df() reads, oldest first
+_tickets_cache = {}
+_tickets_cache_lock = threading.Lock() # Dashboard sessions read and evict concurrently
+
+def invalidate_tickets_cache():
+    """Drops the cached tickets DataFrames so the next read hits the database."""
+    with _tickets_cache_lock:
+        _tickets_cache.clear()
+
+def _store_tickets_cache_entry(cache_key, entry):
+    """Stores entry as the newest cache entry, evicting the oldest beyond TICKETS_CACHE_MAX_ENTRIES."""
+    with _tickets_cache_lock:
+        _tickets_cache.pop(cache_key, None)
+        _tickets_cache[cache_key] = entry
+        while len(_tickets_cache) > TICKETS_CACHE_MAX_ENTRIES:
+            _tickets_cache.pop(next(iter(_tickets_cache)), None)
+
+TICKETS_COLUMNS = (
+    'id', 'title', 'description', 'category', 'file_name',
+    'file_type', 'created_at', 'status', 'resolved_at',
+)
+
+def _tickets_select_sql(columns=TICKETS_COLUMNS, since_sql=None):
+    """SELECT of the given tickets columns, limited to created_at >= since_sql when given."""
+    column_list = ",\n        ".join(columns)
+    sql = f"""
+    SELECT
+        {column_list}
+    FROM tickets
+"""
+    if since_sql is not None:
+        sql += f"    WHERE created_at >= {since_sql}\n"
+    return sql
+
+TICKETS_BASE_SQL = _tickets_select_sql()
+TICKETS_QUERY_SQL = TICKETS_BASE_SQL + "    ORDER BY created_at DESC\n"
+CONNECTORX_PARTITIONS = int(os.getenv("CONNECTORX_PARTITIONS", "4")) # Parallel id-range reads
+_SELECT_TICKETS_STMT = text(TICKETS_QUERY_SQL)
+# Declared up front so pandas allocates typed columns instead of inferring from
+# Python objects; Arrow strings use far less memory than object dtype.
+TICKETS_STRING_DTYPES = {
+    'title': 'string[pyarrow]',
+    'description': 'string[pyarrow]',
+    'category': 'string[pyarrow]',
+    'file_name': 'string[pyarrow]',
+    'file_type': 'string[pyarrow]',
+    'status': 'string[pyarrow]',
+}
+TICKETS_DATE_COLUMNS = ['created_at', 'resolved_at']
+CONNECTORX_DIALECTS = ('mysql', 'postgresql')
+
+def _coerce_tickets_frame(df):
+    """
+    Applies TICKETS_DATE_COLUMNS and TICKETS_STRING_DTYPES to a tickets frame,
+    so the SQLAlchemy and connectorx reads return the same schema.
+    """
+    import pandas as pd
+    for col in TICKETS_DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df.astype({col: dtype for col, dtype in TICKETS_STRING_DTYPES.items() if col in df.columns})
+
+def _tickets_chunk_to_frame(rows, columns):
+    """Builds one typed DataFrame chunk from fetched row tuples."""
+    import pandas as pd
+    return _coerce_tickets_frame(pd.DataFrame.from_records(rows, columns=columns))
+
+def _read_tickets_with_sqlalchemy(stmt=_SELECT_TICKETS_STMT, params=None):
     """
-    Fetches all ticket data including id, title, description, category,
-    file_name, file_type, created_at, status, and resolved_at into a DataFrame.
+    Reads a tickets query through a server-side cursor, building each
+    READ_CHUNK_SIZE batch of rows straight into a typed DataFrame chunk.
+    """
+    import pandas as pd
+    # yield_per streams from the server-side cursor, so at most one chunk of
+    # Python row objects is alive next to the typed chunks; building frames
+    # here skips pandas' read_sql wrapper layer around the same fetchmany loop.
+    with engine.connect().execution_options(stream_results=True, yield_per=READ_CHUNK_SIZE) as conn:
+        result = conn.execute(stmt, params or {})
+        columns = list(result.keys())
+        chunks = [_tickets_chunk_to_frame(rows, columns) for rows in result.partitions()]
+    if not chunks:
+        return _tickets_chunk_to_frame([], columns)
+    return pd.concat(chunks, ignore_index=True, copy=False)
+
+def _read_tickets_with_connectorx(base_sql=TICKETS_BASE_SQL, columns=TICKETS_COLUMNS):
+    """
+    Reads a tickets query (without ORDER BY) with connectorx, skipping
+    per-row Python objects. Returns None on failure so the caller can fall
+    back to SQLAlchemy.
+    """
+    try:
+        url = make_url(DATABASE_URL)
+        # connectorx takes plain scheme URLs (mysql://, postgresql://) without the driver suffix
+        cx_url = url.set(drivername=url.get_backend_name()).render_as_string(hide_password=False)
+        if CONNECTORX_PARTITIONS > 1 and 'id' in columns and 'created_at' in columns:
+            # Partitions are fetched over parallel connections by id range and
+            # concatenated unordered, so restore the created_at ordering here.
+            df = _coerce_tickets_frame(cx.read_sql(
+                cx_url, base_sql, return_type='pandas',
+                partition_on='id', partition_num=CONNECTORX_PARTITIONS
+            ))
+            return df.sort_values('created_at', ascending=False, kind='stable', ignore_index=True)
+        return _coerce_tickets_frame(cx.read_sql(cx_url, base_sql + "    ORDER BY created_at DESC\n", return_type='pandas'))
+    except Exception as e:
+        logger.warning(f"connectorx read failed, falling back to SQLAlchemy: {e}")
+        return None
+
+_TICKETS_FINGERPRINT_STMT = text("SELECT COUNT(*), MAX(created_at) FROM tickets")
+
+def get_tickets_fingerprint():
+    """
+    Cheap change signal for the tickets table: (row count, newest created_at as str).
+    Answerable from the idx_created index, so callers can key caches
+    on it without reading ticket rows. Returns None if the query fails.
+    """
+    if engine is None:
+        return None
+    try:
+        with connect() as conn:
+            count, latest = conn.execute(_TICKETS_FINGERPRINT_STMT).one()
+        return int(count), str(latest)
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error fetching tickets fingerprint: {db_err}", exc_info=True)
+        return None
+
+def get_tickets_df(since=None, columns=None):
+    """
+    Fetches ticket data into a DataFrame, newest first: by default every
+    ticket with id, title, description, category, file_name, file_type,
+    created_at, status, and resolved_at. `columns` limits the SELECT to a
+    subset of those, and `since` (a date or datetime) to tickets created at
+    or after it, so callers only transfer what they display.
+    Results are cached in-process per (since, columns) for
+    TICKETS_CACHE_TTL_SECONDS and invalidated on insert; after that a
+    COUNT/MAX(created_at) probe stands in for the full read while it is
+    unchanged, up to TICKETS_CACHE_MAX_AGE_SECONDS.
     Returns an empty DataFrame on error.
     """
+    import pandas as pd # Deferred: chat lookups and inserts go through this module without needing pandas
+    columns = tuple(columns) if columns is not None else TICKETS_COLUMNS
+    unknown_columns = [col for col in columns if col not in TICKETS_COLUMNS]
+    if unknown_columns:
+        raise ValueError(f"Unknown tickets columns: {unknown_columns}")
     if engine is None:
         logger.error("Database engine is not available. Cannot fetch tickets.")
         return pd.DataFrame()
 
-    query = text("""
-        SELECT
-            id,
-            title,
-            description,
-            category,
-            file_name,
-            file_type,
-            created_at,
-            status,
-            resolved_at
-        FROM tickets
-        ORDER BY created_at DESC;
-    """)
-
-    logger.info("Attempting to fetch all tickets from DB for DataFrame.")
+    cache_key = (since, columns)
+    fingerprint = None
+    with _tickets_cache_lock:
+        cached = _tickets_cache.get(cache_key)
+    if cached is not None:
+        fetched_at, validated_at, cached_fingerprint, cached_df = cached
+        now = time.monotonic()
+        if now - validated_at < TICKETS_CACHE_TTL_SECONDS:
+            logger.debug(f"Serving {len(cached_df)} tickets from in-process cache.")
+            return cached_df.copy(deep=False)
+        if now - fetched_at < TICKETS_CACHE_MAX_AGE_SECONDS:
+            fingerprint = get_tickets_fingerprint()
+            if fingerprint is not None and fingerprint == cached_fingerprint:
+                logger.debug(f"Tickets unchanged {fingerprint}; serving {len(cached_df)} cached tickets.")
+                with _tickets_cache_lock:
+                    if cache_key in _tickets_cache: # Not re-added after a concurrent invalidation
+                        _tickets_cache[cache_key] = (fetched_at, now, cached_fingerprint, cached_df)
+                return cached_df.copy(deep=False)
+
+    logger.info(f"Attempting to fetch tickets from DB for DataFrame (since={since}, {len(columns)} columns).")
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
-            logger.info(f"Successfully fetched {len(df)} tickets into DataFrame.")
-            expected_cols = ['id', 'title', 'description', 'category', 'status', 'resolved_at', 'created_at']
-            missing_cols = [col for col in expected_cols if col not in df.columns]
-            if missing_cols:
-                 logger.warning(f"Fetched DataFrame is missing expected columns: {missing_cols}. Check DB schema and query.")
-            return df
+        # Probed before the read, so a concurrent insert at worst costs one extra re-read
+        if fingerprint is None:
+            fingerprint = get_tickets_fingerprint()
+        df = None
+        if cx is not None and engine.dialect.name in CONNECTORX_DIALECTS:
+            # connectorx takes no bind parameters; the literal is rendered from a date object, never from user text
+            since_literal = f"'{since:%Y-%m-%d %H:%M:%S}'" if since is not None else None
+            df = _read_tickets_with_connectorx(_tickets_select_sql(columns, since_literal), columns)
+        if df is None:
+            if since is None and columns == TICKETS_COLUMNS:
+                df = _read_tickets_with_sqlalchemy()
+            else:
+                stmt = text(_tickets_select_sql(columns, ":since" if since is not None else None) + "    ORDER BY created_at DESC\n")
+                df = _read_tickets_with_sqlalchemy(stmt, {"since": since} if since is not None else None)
+        logger.info(f"Successfully fetched {len(df)} tickets into DataFrame.")
+        expected_cols = [col for col in ('id', 'title', 'description', 'category', 'status', 'resolved_at', 'created_at') if col in columns]
+        missing_cols = [col for col in expected_cols if col not in df.columns]
+        if missing_cols:
+             logger.warning(f"Fetched DataFrame is missing expected columns: {missing_cols}. Check DB schema and query.")
     except sqlalchemy_exc.SQLAlchemyError as db_err:
-        logger.error(f"Database error fetching all tickets: {db_err}", exc_info=True)
+        logger.error(f"Database error fetching tickets: {db_err}", exc_info=True)
         return pd.DataFrame()
     except Exception as e:
-        logger.error(f"Unexpected error fetching all tickets: {e}", exc_info=True)
+        logger.error(f"Unexpected error fetching tickets: {e}", exc_info=True)
         return pd.DataFrame()
+    fetched_at = time.monotonic()
+    _store_tickets_cache_entry(cache_key, (fetched_at, fetched_at, fingerprint, df))
+    return df.copy(deep=False)
+
+
+def _ticket_insert_statement(dialect_name):
+    """
+    Builds the tickets INSERT for the given dialect. Rows whose
+    content_sha256 already exists are skipped, so re-ingestion is idempotent.
+    """
+    insert_sql = """
+        INSERT INTO tickets
+        (title, description, category, file_name, file_type, content_sha256)
+        VALUES (:title, :desc, :category, :file_name, :file_type, :content_sha256)
+    """
+    if dialect_name in ('mysql', 'mariadb'):
+        return text(insert_sql + " ON DUPLICATE KEY UPDATE id = id")
+    if dialect_name in ('postgresql', 'sqlite'):
+        return text(insert_sql + " ON CONFLICT (content_sha256) DO NOTHING")
+    return text(insert_sql)
 
+# Statements are built once so the parsed TextClause is reused and SQLAlchemy's
+# compiled-statement cache hits on every execution.
+_INSERT_TICKET_STMT = _ticket_insert_statement(engine.dialect.name) if engine is not None else None
+HASH_LOOKUP_CHUNK_SIZE = 999 # Hashes per IN list; stays under every driver's bound-parameter cap
+_SELECT_CONTENT_HASHES_STMT = text("SELECT content_sha256 FROM tickets WHERE content_sha256 IN :hashes").bindparams(
+    bindparam("hashes", expanding=True)
+)
 
-def insert_ticket(title, description, category, file_name=None, file_type=None):
+
+def get_existing_content_hashes(hashes):
+    """
+    Returns the subset of the given content hashes already stored in the
+    tickets table, with one query per HASH_LOOKUP_CHUNK_SIZE hashes.
+    Returns an empty set on error.
+    """
+    if engine is None:
+        logger.error("Database engine is not available. Cannot look up content hashes.")
+        return set()
+    if not hashes:
+        return set()
+
+    try:
+        hashes = list(hashes)
+        existing = set()
+        with connect() as conn:
+            for start in range(0, len(hashes), HASH_LOOKUP_CHUNK_SIZE):
+                chunk = hashes[start:start + HASH_LOOKUP_CHUNK_SIZE]
+                existing.update(row[0] for row in conn.execute(_SELECT_CONTENT_HASHES_STMT, {"hashes": chunk}))
+        return existing
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error looking up {len(hashes)} content hashes: {db_err}", exc_info=True)
+        return set()
+    except Exception as e:
+        logger.error(f"Unexpected error looking up content hashes: {e}", exc_info=True)
+        return set()
+
+
+def insert_ticket(title, description, category, file_name=None, file_type=None, content_sha256=None):
     """
     Inserts a new ticket into the database.
     Returns True on success, False on failure.
@@ -90,22 +372,19 @@ def insert_ticket(title, description, category, file_name=None, file_type=None):
     # logger.info(f"Attempting to insert ticket with title: {title}") # Moved logging to ingestion.py for this specific call
     try:
         with engine.connect() as conn: # Ensure connection is properly managed
-            insert_statement = text("""
-                INSERT INTO tickets
-                (title, description, category, file_name, file_type)
-                VALUES (:title, :desc, :category, :file_name, :file_type)
-            """)
             conn.execute(
-                insert_statement,
+                _INSERT_TICKET_STMT,
                 {
                     "title": title,
                     "desc": description,
                     "category": category,
                     "file_name": file_name,
-                    "file_type": file_type
+                    "file_type": file_type,
+                    "content_sha256": content_sha256
                  }
             )
             conn.commit()
+            invalidate_tickets_cache()
             # logger.info(f"Successfully inserted ticket: {title}") # Moved to ingestion.py
             return True
     except sqlalchemy_exc.SQLAlchemyError as db_err:
@@ -116,4 +395,90 @@ def insert_ticket(title, description, category, file_name=None, file_type=None):
         return False
     except Exception as e:
         logger.error(f"Unexpected error inserting ticket '{title}': {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+
+_TICKET_COPY_COLUMNS = "title, description, category, file_name, file_type, content_sha256"
+_TICKET_ROW_KEYS = ("title", "desc", "category", "file_name", "file_type", "content_sha256")
+
+def _csv_field(value):
+    """Quotes a value for COPY ... FORMAT csv; None stays unquoted so it loads as NULL."""
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_ticket_rows_postgres(conn, rows):
+    """
+    Loads rows with COPY FROM STDIN into a temp staging table, then moves them
+    into tickets with ON CONFLICT DO NOTHING (COPY itself cannot skip duplicates).
+    Runs on conn's DBAPI connection, inside its current transaction.
+    """
+    conn.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS tickets_copy_staging (
+            title TEXT, description TEXT, category VARCHAR(50),
+            file_name TEXT, file_type VARCHAR(10), content_sha256 CHAR(64)
+        )
+    """))
+    conn.execute(text("TRUNCATE tickets_copy_staging"))
+
+    csv_data = "".join(
+        ",".join(_csv_field(row[key]) for key in _TICKET_ROW_KEYS) + "\n"
+        for row in rows
+    )
+    copy_sql = f"COPY tickets_copy_staging ({_TICKET_COPY_COLUMNS}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'): # psycopg2
+            cursor.copy_expert(copy_sql, io.StringIO(csv_data))
+        else: # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(csv_data)
+    finally:
+        cursor.close()
+
+    conn.execute(text(f"""
+        INSERT INTO tickets ({_TICKET_COPY_COLUMNS})
+        SELECT {_TICKET_COPY_COLUMNS} FROM tickets_copy_staging
+        ON CONFLICT (content_sha256) DO NOTHING
+    """))
+
+def _write_ticket_rows(conn, rows):
+    """Writes rows on conn using the fastest bulk path for the dialect."""
+    if conn.dialect.name == 'postgresql':
+        _copy_ticket_rows_postgres(conn, rows)
+    else:
+        # A list of parameter dicts makes SQLAlchemy use executemany (batched
+        # multi-VALUES on dialects that support it).
+        conn.execute(_INSERT_TICKET_STMT, rows)
+
+def insert_tickets_bulk(rows, conn=None):
+    """
+    Inserts multiple tickets in a single transaction.
+    Each row is a dict with keys: title, desc, category, file_name, file_type,
+    content_sha256. Rows with an already-stored content_sha256 are skipped.
+    If conn is given, the rows are written inside a SAVEPOINT on that
+    connection and committing is left to the caller.
+    Returns the number of rows submitted (0 on failure).
+    """
+    if engine is None:
+        logger.error("Database engine is not available. Cannot insert tickets.")
+        return 0
+    if not rows:
+        return 0
+
+    try:
+        if conn is not None:
+            # The savepoint keeps a failed batch from aborting the caller's transaction
+            with conn.begin_nested():
+                _write_ticket_rows(conn, rows)
+            return len(rows)
+        with engine.begin() as own_conn:
+            _write_ticket_rows(own_conn, rows)
+        invalidate_tickets_cache()
+        return len(rows)
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error bulk inserting {len(rows)} tickets: {db_err}", exc_info=True)
+        return 0
+    except Exception as e:
+        logger.error(f"Unexpected error bulk inserting {len(rows)} tickets: {e}", exc_info=True)
+        return 0
@@ -1,11 +1,15 @@
 # File path: backend/ingestion.py
 import os
-import traceback
+import hashlib
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 # from time import sleep # Optional, uncomment if needed
 from dotenv import load_dotenv
-from data_processing.document_loader import load_pdf, load_txt, load_docx
-from backend.db import insert_ticket
+from data_processing.workers import MAX_CONTENT_LENGTH, POOL_CONTEXT, SUPPORTED_EXTENSIONS, process_file
+from backend import db
+from backend.db import insert_tickets_bulk, get_existing_content_hashes, invalidate_tickets_cache
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 
@@ -15,93 +19,244 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 # client = OpenAI() # Keep if needed for OpenAI agent integration
 
-MAX_CONTENT_LENGTH = 5000
+INSERT_BATCH_SIZE = 500 # Rows per bulk INSERT transaction
+# Parse worker processes; 0 means one per CPU. Never more than there are files to parse
+INGESTION_MAX_WORKERS = int(os.getenv("INGESTION_MAX_WORKERS", "0"))
+PARSE_CACHE_MAX_ENTRIES = 1000
+PARSE_CACHE_PATH = Path(os.getenv(
+    "INGESTION_PARSE_CACHE_PATH",
+    Path(__file__).resolve().parent.parent / ".cache" / "parse_cache.pkl"
+))
 
-def process_file(filepath):
+def compute_file_hash(filepath):
+    """Returns the SHA-256 hex digest of a file's raw bytes."""
+    with open(filepath, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'): # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+def _parse_cache_key(filepath, content_hash=None, max_chars=MAX_CONTENT_LENGTH):
     """
-    Processes a single file based on its extension.
-    Returns the file content as a string or None if processing fails.
+    Cache key for a parse result: (content sha256, max_chars) when the hash is
+    known, so renamed, copied or touched files still hit; otherwise
+    (path, mtime_ns, size, max_chars), which changes whenever the file is modified.
     """
-    ext = filepath.suffix.lower()
+    if content_hash:
+        return (content_hash, max_chars)
+    stat = filepath.stat()
+    return (str(filepath.resolve()), stat.st_mtime_ns, stat.st_size, max_chars)
+
+def load_parse_cache(cache_path=PARSE_CACHE_PATH):
+    """Loads the persisted parse cache, returning an empty one if it is missing or unreadable."""
     try:
-        if ext == '.pdf':
-            return load_pdf(filepath)
-        elif ext == '.txt':
-            return load_txt(filepath)
-        elif ext == '.docx':
-            return load_docx(filepath)
-        else:
-            logger.warning(f"Skipping unsupported file type: {filepath.name}")
-            return None
+        with open(cache_path, 'rb') as f:
+            cache = pickle.load(f)
+        if isinstance(cache, OrderedDict):
+            return cache
+        logger.warning(f"Ignoring parse cache with unexpected type at {cache_path}.")
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        logger.error(f"--- ERROR PROCESSING FILE: {filepath.name} ---")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error message: {e}")
-        logger.error("Traceback for file processing error:", exc_info=True)
-        logger.error("---------------------------------------------")
-        return None
-
-def ingest_documents(directory):
+        logger.warning(f"Could not read parse cache at {cache_path}, starting empty: {e}")
+    return OrderedDict()
+
+def save_parse_cache(cache, cache_path=PARSE_CACHE_PATH):
+    """Trims the parse cache to PARSE_CACHE_MAX_ENTRIES (least recently used first) and persists it."""
+    while len(cache) > PARSE_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(cache_path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write parse cache to {cache_path}: {e}")
+
+def ingest_documents(directory, files=None):
     """
     Finds supported documents in a directory, processes them,
     and attempts to insert their content into the database.
     Reports a summary of successes and failures.
+    If files is given, it replaces the directory scan: an iterable of file
+    paths that may still be written while it is consumed (run_ingestion.py
+    feeds it from create_samples). Each file is handed to the parse workers
+    as it arrives, so files already stored are dropped after parsing rather
+    than before.
     """
     source_path = Path(directory)
-    if not source_path.is_dir():
+    streaming = files is not None
+    # A streamed directory may not exist yet: its writer creates it
+    if not streaming and not source_path.is_dir():
         logger.error(f"Error: Directory not found: {directory}")
         return
 
-    files_to_process = [f for f in source_path.iterdir()
-                        if f.is_file() and f.suffix.lower() in ('.pdf', '.txt', '.docx')]
+    if streaming:
+        if db.engine is None:
+            logger.error("Database engine is not available. Cannot ingest documents.")
+            return
+        incoming_files = (Path(f) for f in files if Path(f).suffix.lower() in SUPPORTED_EXTENSIONS)
+    else:
+        # os.scandir returns the entry type with the directory listing, avoiding a stat() per file
+        with os.scandir(source_path) as entries:
+            incoming_files = [Path(entry.path) for entry in entries
+                              if entry.is_file(follow_symlinks=False)
+                              and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS]
 
-    total_files = len(files_to_process)
-    success_count = 0
-    failure_count = 0
+    # Parsing is CPU-bound and independent per file, so it runs in worker
+    # processes; DB inserts stay in the parent, which owns the engine.
+    # Files whose bytes were parsed before (keyed on their sha256) reuse the cached text
+    parse_cache = load_parse_cache()
+    file_hashes = {}
+    cache_keys = {}
+    parse_futures = {} # Streaming only: parses submitted while files are still arriving
+    # Parse worker count when the number of files is not known up front
+    streaming_workers = INGESTION_MAX_WORKERS or os.cpu_count() or 1
 
-    if total_files == 0:
-        logger.info(f"No supported files (.pdf, .txt, .docx) found in '{directory}'.")
-        return
+    def register_file(filepath):
+        """Hashes filepath for dedupe and computes its parse cache key."""
+        try:
+            file_hashes[filepath] = compute_file_hash(filepath)
+        except OSError as e:
+            logger.warning(f"Could not hash {filepath.name}, it will be ingested without dedupe: {e}")
+            file_hashes[filepath] = None
+        try:
+            cache_keys[filepath] = _parse_cache_key(filepath, file_hashes[filepath])
+        except OSError:
+            cache_keys[filepath] = None
+
+    executor = ProcessPoolExecutor(max_workers=streaming_workers, mp_context=POOL_CONTEXT) if streaming else None
+    try:
+        files_to_process = []
+        for filepath in incoming_files:
+            register_file(filepath)
+            files_to_process.append(filepath)
+            if streaming and cache_keys[filepath] not in parse_cache:
+                parse_futures[filepath] = executor.submit(process_file, filepath)
+
+        total_files = len(files_to_process)
+        success_count = 0
+        failure_count = 0
 
-    logger.info(f"Found {total_files} files to process in '{directory}'. Starting ingestion...")
-
-    for i, filepath in enumerate(files_to_process):
-        # Log processing attempt for each file using the module's logger
-        logger.info(f"Processing file {i + 1}/{total_files}: {filepath.name}...")
-        content = process_file(filepath)
-
-        if content is not None:
-            try:
-                # Attempt to insert the processed content into the database
-                inserted_successfully = insert_ticket(
-                    title=filepath.stem,
-                    description=content[:MAX_CONTENT_LENGTH],
-                    category="Pending",
-                    file_name=filepath.name,
-                    file_type=filepath.suffix[1:].lower()
-                )
-
-                if inserted_successfully:
-                    success_count += 1
-                    logger.info(f"  -> Successfully processed and inserted: {filepath.name}")
-                else:
-                    logger.error(f"  -> FAILED to insert ticket for {filepath.name}. Check DB logs or previous 'engine not available' / DB error messages.")
-                    failure_count += 1
-
-            except SQLAlchemyError as db_err: # This catch block might be redundant if insert_ticket handles all SQLAlc errors
-                logger.error(f"  -> DB INSERTION FAILED for {filepath.name} (SQLAlchemyError): {db_err}", exc_info=True)
-                failure_count += 1
-            except Exception as general_err:
-                logger.error(f"  -> UNEXPECTED ERROR during insertion phase for {filepath.name}: {general_err}", exc_info=True)
-                failure_count += 1
+        if total_files == 0:
+            logger.info(f"No supported files ({', '.join(sorted(SUPPORTED_EXTENSIONS))}) found in '{directory}'.")
+            return
+
+        logger.info(f"Found {total_files} files in '{directory}'. Checking for previously ingested content...")
+
+        # Skip files whose exact bytes are already stored, before paying for any parsing
+        # (streamed files were already handed to the workers; their parses are dropped)
+        known_hashes = get_existing_content_hashes({h for h in file_hashes.values() if h})
+        files_to_process = [f for f in files_to_process if file_hashes[f] not in known_hashes]
+        skipped_count = total_files - len(files_to_process)
+        for filepath, future in parse_futures.items():
+            if file_hashes[filepath] in known_hashes:
+                future.cancel()
+
+        if not files_to_process:
+            logger.info(f"All {total_files} files in '{directory}' were already ingested. Nothing to do.")
+            return
+
+        logger.info(f"Skipping {skipped_count} unchanged files. Starting ingestion of {len(files_to_process)} files...")
+
+        if db.engine is None:
+            logger.error("Database engine is not available. Cannot ingest documents.")
+            return
+
+        pending_rows = []
+
+        def flush_pending_rows(conn):
+            """Bulk-inserts the buffered rows on conn and returns (submitted, failed) counts."""
+            if not pending_rows:
+                return 0, 0
+            batch_size = len(pending_rows)
+            submitted = insert_tickets_bulk(pending_rows, conn=conn)
+            pending_rows.clear()
+            if submitted:
+                logger.info(f"  -> Bulk insert submitted {submitted} tickets.")
+                return submitted, 0
+            logger.error(f"  -> FAILED to bulk insert {batch_size} tickets. Check DB logs or previous DB error messages.")
+            return 0, batch_size
+
+        files_to_parse = [f for f in files_to_process if cache_keys[f] not in parse_cache]
+        logger.info(f"Parse cache hits: {len(files_to_process) - len(files_to_parse)}/{len(files_to_process)}")
+        if streaming:
+            parsed = (parse_futures[f].result() for f in files_to_parse)
         else:
-            logger.info(f"  -> Failed to process file content for {filepath.name} (see error message above).")
-            failure_count += 1
+            # executor.map submits every file up front, so workers keep parsing
+            # while the parent is blocked on a bulk INSERT
+            max_workers = max(1, min(INGESTION_MAX_WORKERS or os.cpu_count() or 1, len(files_to_parse)))
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=POOL_CONTEXT)
+            chunksize = max(1, len(files_to_parse) // (4 * max_workers))
+            parsed = executor.map(process_file, files_to_parse, chunksize=chunksize)
+
+        def iter_contents(parsed):
+            """Yields content in files_to_process order, from the cache or the worker results."""
+            # Decided by membership in files_to_parse, not by the cache as it fills up:
+            # identical files share a key, and each parsed one must consume its own result
+            parsed_files = set(files_to_parse)
+            for filepath in files_to_process:
+                key = cache_keys[filepath]
+                if filepath not in parsed_files:
+                    parse_cache.move_to_end(key)
+                    yield parse_cache[key]
+                    continue
+                content = next(parsed)
+                if content and key is not None:
+                    parse_cache[key] = content
+                yield content
+
+        failed_file_names = [] # Reported once in the summary instead of per file
+        # Per-file progress is DEBUG-only; check the level once rather than per iteration
+        log_each_file = logger.isEnabledFor(logging.DEBUG)
+        try:
+            # One connection and one transaction for the whole run: a single COMMIT at the end
+            with db.engine.begin() as conn:
+                for i, (filepath, content) in enumerate(zip(files_to_process, iter_contents(parsed))):
+                    if log_each_file:
+                        logger.debug("Processed file %d/%d: %s", i + 1, len(files_to_process), filepath.name)
+                    if content is not None:
+                        file_type = filepath.suffix.lower()[1:]
+                        pending_rows.append({
+                            "title": filepath.stem,
+                            "desc": content[:MAX_CONTENT_LENGTH],
+                            "category": "Pending",
+                            "file_name": filepath.name,
+                            "file_type": file_type,
+                            "content_sha256": file_hashes[filepath]
+                        })
+                        if len(pending_rows) >= INSERT_BATCH_SIZE:
+                            submitted, failed = flush_pending_rows(conn)
+                            success_count += submitted
+                            failure_count += failed
+                    else:
+                        failed_file_names.append(filepath.name)
 
-        # sleep(0.1) # Optional delay
+                submitted, failed = flush_pending_rows(conn)
+                success_count += submitted
+                failure_count += failed
+        except SQLAlchemyError as db_err:
+            logger.error(f"  -> Ingestion transaction FAILED and was rolled back: {db_err}", exc_info=True)
+            failure_count += success_count
+            success_count = 0
+        finally:
+            invalidate_tickets_cache()
+            save_parse_cache(parse_cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    failure_count += len(failed_file_names)
 
     logger.info("--- Ingestion Summary ---") # Add newline for readability before summary
     logger.info(f"Total files found: {total_files}")
-    logger.info(f"Successfully processed and inserted: {success_count}")
+    logger.info(f"Skipped as already ingested: {skipped_count}")
+    # Submitted, not inserted: the database skips rows whose content_sha256 is
+    # already stored (e.g. identical files within this run) without reporting them
+    logger.info(f"Successfully processed and submitted for insert: {success_count}")
     logger.info(f"Failed to process or insert: {failure_count}")
-    logger.info("-------------------------") # Add newline after summary
\ No newline at end of file
+    if failed_file_names:
+        logger.info(f"Files whose content could not be processed (see errors above): {', '.join(failed_file_names)}")
+    logger.info("-------------------------") # Add newline after summary
@@ -0,0 +1,138 @@
+# File path: backend/local_classifier.py
+import os
+import re
+import functools
+import logging
+
+# Get a logger instance for this module
+logger = logging.getLogger(__name__)
+
+LOCAL_CATEGORIZER_ENABLED = os.getenv("LOCAL_CATEGORIZER", "").lower() in ("1", "true", "yes")
+# Minimum cosine-similarity lead of the best category over the runner-up before
+# a local prediction is trusted; anything closer is left for the LLM
+LOCAL_CATEGORIZER_MARGIN = float(os.getenv("LOCAL_CATEGORIZER_MARGIN", "0.08"))
+
+# Short descriptions embedded once per category; their normalized mean is the category centroid
+CATEGORY_PROTOTYPES = {
+    "Network Security": [
+        "firewall rule, VPN tunnel or intrusion detection alert",
+        "suspicious network traffic, port scan or DDoS against our servers",
+    ],
+    "Phishing Attack": [
+        "user received a suspicious email asking for their password",
+        "phishing link or spoofed sender impersonating a colleague or bank",
+    ],
+    "Malware Infection": [
+        "antivirus detected a virus, trojan or ransomware on a workstation",
+        "computer infected with malware, encrypted files or unknown processes",
+    ],
+    "Access Control": [
+        "user cannot log in, account locked out or password reset needed",
+        "request to grant or revoke permissions to a shared folder or application",
+    ],
+    "Policy Violation": [
+        "employee breached the acceptable use or security policy",
+        "unauthorized software installed or company data used against policy",
+    ],
+    "Data Leak": [
+        "confidential customer data exposed or sent to an external party",
+        "sensitive files shared publicly or leaked outside the organization",
+    ],
+    "Hardware Issue": [
+        "laptop, printer, monitor or keyboard is broken or not powering on",
+        "physical device failure, damaged disk or faulty hardware component",
+    ],
+    "Software Issue": [
+        "application crashes, shows an error message or fails to install",
+        "bug in a program, software update failed or app is very slow",
+    ],
+}
+
+# Unambiguous keywords checked before any embedding work; a ticket is resolved
+# by rules only when exactly one category's pattern matches it
+CATEGORY_KEYWORD_RULES = {
+    "Phishing Attack": re.compile(r"\b(?:phishing|phish(?:ed)?|spoof(?:ed|ing)?|smishing|vishing)\b", re.IGNORECASE),
+    "Malware Infection": re.compile(r"\b(?:malware|ransomware|trojan|virus|worm|spyware|keylogger)\b", re.IGNORECASE),
+    "Network Security": re.compile(r"\b(?:vpn|firewall|ddos|port scan|intrusion detection|ids alert)\b", re.IGNORECASE),
+    "Data Leak": re.compile(r"\b(?:data leak|data breach|leaked|exfiltrat\w*)\b", re.IGNORECASE),
+    "Access Control": re.compile(r"\b(?:locked out|account lockout|password reset|mfa|2fa)\b", re.IGNORECASE),
+}
+
+
+def classify_by_rules(text, categories):
+    """Returns the single category whose keyword rule matches text, else None (no match or ambiguous)."""
+    matched = [category for category in categories
+               if category in CATEGORY_KEYWORD_RULES and CATEGORY_KEYWORD_RULES[category].search(text)]
+    return matched[0] if len(matched) == 1 else None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_embedder():
+    """
+    Returns the all-MiniLM-L6-v2 ONNX embedding function bundled with chromadb,
+    or None if it cannot be loaded (the model is downloaded once on first use).
+    """
+    try:
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        return ONNXMiniLM_L6_V2()
+    except Exception as e:
+        logger.warning(f"Local categorizer unavailable, all tickets will go to the LLM: {e}")
+        return None
+
+
+def _embed(texts):
+    """Embeds texts as an L2-normalized float32 matrix (one row per text)."""
+    import numpy as np
+    vectors = np.asarray(_get_embedder()(list(texts)), dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+@functools.lru_cache(maxsize=16)
+def _category_centroids(categories):
+    """(category names, normalized float32 centroid matrix) for the categories that have prototypes."""
+    import numpy as np
+    known = tuple(category for category in categories if category in CATEGORY_PROTOTYPES)
+    centroids = np.stack([_embed(CATEGORY_PROTOTYPES[category]).mean(axis=0) for category in known])
+    return known, centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+
+def _classify_by_embeddings(texts, categories):
+    """Embedding step of classify_locally; None where the top-1 margin is too small."""
+    if not texts or _get_embedder() is None:
+        return [None] * len(texts)
+    try:
+        import numpy as np
+        known, centroids = _category_centroids(tuple(categories))
+        if len(known) < 2:
+            return [None] * len(texts)
+        # float32 on purpose: numpy's integer matmul bypasses BLAS, so an int8
+        # variant (upcast to int32 on both sides) is slower, and the centroid
+        # matrix is only a few KB
+        scores = _embed(texts) @ centroids.T
+        top_two = np.sort(scores, axis=1)[:, -2:]
+        confident = (top_two[:, 1] - top_two[:, 0]) >= LOCAL_CATEGORIZER_MARGIN
+        best = scores.argmax(axis=1)
+        return [known[b] if ok else None for b, ok in zip(best.tolist(), confident.tolist())]
+    except Exception as e:
+        logger.error(f"Local categorization failed, falling back to the LLM: {e}", exc_info=True)
+        return [None] * len(texts)
+
+
+def classify_locally(texts, categories):
+    """
+    Categorizes texts without the LLM: first by CATEGORY_KEYWORD_RULES, then
+    zero-shot by cosine similarity to category centroids for the rest.
+    Returns a list aligned with texts holding the category, or None where no
+    single rule matched and the top-1 margin is below LOCAL_CATEGORIZER_MARGIN
+    (or the model is unavailable), so the caller can fall back to the LLM.
+    """
+    if not LOCAL_CATEGORIZER_ENABLED or not texts:
+        return [None] * len(texts)
+    results = [classify_by_rules(text, categories) for text in texts]
+    rule_hits = sum(result is not None for result in results)
+    remaining = [i for i, result in enumerate(results) if result is None]
+    for i, category in zip(remaining, _classify_by_embeddings([texts[i] for i in remaining], categories)):
+        results[i] = category
+    resolved = sum(result is not None for result in results)
+    logger.info(f"Local categorizer resolved {resolved}/{len(texts)} tickets ({rule_hits} by keyword rules).")
+    return results
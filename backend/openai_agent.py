@@ -1,124 +1,802 @@
 # File path: backend/openai_agent.py
 import os
-import pandas as pd
-from openai import OpenAI
+import atexit
+import json
+import random
+import hashlib
+import time
+import asyncio
+import threading
+import functools
+from contextvars import ContextVar
+from types import MappingProxyType
+import httpx
+from cachetools import LRUCache, TTLCache
+import openai
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_exponential
-from sqlalchemy import text, exc as sqlalchemy_exc # For DB functions if they remain here
+from sqlalchemy import text, bindparam, exc as sqlalchemy_exc # For DB functions if they remain here
 import logging
 import re # For regular expression-based cleaning
+from backend import category_cache
+from backend.local_classifier import classify_locally
+from backend.openai_batch import BatchError, submit_batch, wait_for_batch
 
 # Get a logger instance for this module
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# --- Initialize OpenAI Client ---
+# --- Initialize OpenAI Clients ---
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=50)
+OPENAI_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+def _http2_available():
+    """httpx only speaks HTTP/2 when the optional h2 package is installed."""
+    try:
+        import h2 # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("h2 package not installed; OpenAI clients will use HTTP/1.1 keep-alive.")
+        return False
+
 client = None
+_async_client_factory = None # Builds the per-event-loop AsyncOpenAI clients (see _with_async_client)
 try:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         logger.critical("OPENAI_API_KEY environment variable not found!")
     else:
-        client = OpenAI(api_key=api_key)
-        logger.info("OpenAI client initialized successfully.")
+        # One pooled transport for the sync client for the whole process; with
+        # HTTP/2, concurrent requests multiplex over a single TLS connection
+        use_http2 = _http2_available()
+        # Retries are handled by call_openai_api / call_openai_api_async (Retry-After aware)
+        client = OpenAI(api_key=api_key, max_retries=0, http_client=DefaultHttpxClient(
+            http2=use_http2, limits=OPENAI_HTTP_LIMITS, timeout=OPENAI_HTTP_TIMEOUT))
+        # Async pools cannot be shared the same way: their connections belong to the
+        # event loop that opened them, and every asyncio.run() closes its loop
+        def _async_client_factory():
+            return AsyncOpenAI(api_key=api_key, max_retries=0, http_client=DefaultAsyncHttpxClient(
+                http2=use_http2, limits=OPENAI_HTTP_LIMITS, timeout=OPENAI_HTTP_TIMEOUT))
+        logger.info("OpenAI clients initialized successfully.")
 except Exception as e:
     logger.error(f"Failed to initialize OpenAI client: {e}", exc_info=True)
     client = None
+    _async_client_factory = None
+
+# The AsyncOpenAI client of the event loop running the current task
+_loop_aclient = ContextVar("openai_loop_aclient", default=None)
+
+
+async def _with_async_client(coro):
+    """
+    Awaits coro with a fresh AsyncOpenAI client for the running event loop,
+    closing its connections before the loop ends. Wraps every asyncio.run()
+    entry point, so no pooled connection outlives the loop it was opened on.
+    """
+    if _async_client_factory is None:
+        return await coro # call_openai_api_async reports the missing client
+    async with _async_client_factory() as loop_client:
+        token = _loop_aclient.set(loop_client)
+        try:
+            return await coro
+        finally:
+            _loop_aclient.reset(token)
+
+if client is not None:
+    # Close pooled keep-alive sockets cleanly at interpreter exit (async clients close with their loop)
+    atexit.register(client.close)
+
+OPENAI_WARM_POOL = os.getenv("OPENAI_WARM_POOL", "1").lower() in ("1", "true", "yes")
+
+def _warm_connection_pool():
+    """
+    Opens a pooled connection to the API (TCP, TLS and ALPN) with a models.list()
+    call, so the first user request does not pay the handshake. Failures are only logged.
+    """
+    try:
+        # with_options shares the client's httpx pool, so the warmed connection is reused
+        client.with_options(timeout=10.0).models.list()
+        logger.info("OpenAI connection pool warmed.")
+    except Exception as e:
+        logger.warning(f"OpenAI connection pool warm-up failed (first request will connect): {e}")
+
+if client is not None and OPENAI_WARM_POOL:
+    # Background thread so importing this module never blocks on the network.
+    # Only the sync pool is warmed: async clients live for a single asyncio.run()
+    threading.Thread(target=_warm_connection_pool, name="openai-pool-warmup", daemon=True).start()
+
+# Upper bound on in-flight requests, per batch helper call and for the process's sync calls
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "10"))
+# Closed-set classification does not need a large model; override per deployment
+CATEGORIZER_MODEL = os.getenv("CATEGORIZER_MODEL", "gpt-4o-mini")
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3500"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+OPENAI_MAX_ATTEMPTS = 3
+OPENAI_BACKOFF_MAX_SECONDS = 8 # Upper bound of the jittered backoff window
+
+# Transient failures worth another attempt (APIConnectionError covers timeouts).
+# Anything else, e.g. 400/401/403/404, fails identically every time and is raised at once
+_RETRYABLE_OPENAI_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# Shared by every Streamlit session thread, so concurrent users and rapid
+# resubmits queue here instead of bursting into 429s. A threading semaphore
+# rather than an asyncio one: the sync client is used from many threads, and an
+# asyncio.Semaphore is bound to a single event loop (each asyncio.run() is a new one)
+_request_slots = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+
+# Monotonic time until which no new request is sent. A 429 on any thread or
+# coroutine pushes it out by the wait the server asked for, so every caller
+# backs off together instead of each hitting its own 429 first
+_rate_limit_lock = threading.Lock()
+_rate_limited_until = 0.0
+
+
+def _pause_requests(seconds):
+    """Holds back every new request for seconds (never shortens a pause already in place)."""
+    global _rate_limited_until
+    with _rate_limit_lock:
+        _rate_limited_until = max(_rate_limited_until, time.monotonic() + seconds)
+
+
+def _seconds_until_unpaused():
+    return max(_rate_limited_until - time.monotonic(), 0.0)
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket for the account's requests-per-minute and tokens-per-minute
+    limits. Both buckets refill continuously on a monotonic clock; acquire()
+    waits until one request and the estimated tokens are available.
+    The module-level instance is shared by event loops on several OS threads
+    (chat workers, the categorizer's thread pool, each with its own
+    asyncio.run()), so the refill, check and deduct run under a threading.Lock;
+    the lock is never held while waiting.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60.0
+        self._last_refill = now # Callers hold self._lock
+        self._available_requests = min(self.requests_per_minute, self._available_requests + elapsed_minutes * self.requests_per_minute)
+        self._available_tokens = min(self.tokens_per_minute, self._available_tokens + elapsed_minutes * self.tokens_per_minute)
+
+    async def acquire(self, estimated_tokens):
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute) # A single oversized request must not wait forever
+        while True:
+            with self._lock:
+                self._refill()
+                if self._available_requests >= 1 and self._available_tokens >= estimated_tokens:
+                    self._available_requests -= 1
+                    self._available_tokens -= estimated_tokens
+                    return
+                request_wait = (1 - self._available_requests) * 60.0 / self.requests_per_minute
+                token_wait = (estimated_tokens - self._available_tokens) * 60.0 / self.tokens_per_minute
+            await asyncio.sleep(max(request_wait, token_wait, 0.01))
+
+
+_rate_limiter = AsyncRateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
 
 
 # --- Database Functions (Used by summary/resolution/insights) ---
-def get_ticket_from_db_by_title(ticket_title):
-    """Fetch ticket from database using the title"""
-    from backend.db import engine as db_engine
+# Built once at import so each execution hits SQLAlchemy's compiled-statement cache
+_TICKET_COLUMNS = "id, title, description, category, status, resolved_at, file_name, file_type, created_at"
+_SELECT_TICKETS_BY_TITLES = text(
+    f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE title IN :titles"
+).bindparams(bindparam("titles", expanding=True))
+_SELECT_CATEGORY_COUNTS = text("SELECT category, COUNT(*) AS count FROM tickets GROUP BY category ORDER BY count DESC")
+TITLE_LOOKUP_CHUNK_SIZE = 999 # Titles per IN list; stays under every driver's bound-parameter cap
+
+# Found tickets by title; the TTL bounds staleness when other processes update tickets
+_ticket_by_title_cache = TTLCache(maxsize=1024, ttl=60)
+# cachetools caches are not thread-safe (get() expires entries), and this one is
+# shared by Streamlit session threads, chat workers and the categorizer's pool
+_ticket_by_title_lock = threading.Lock()
+
+def get_tickets_from_db_by_titles(ticket_titles):
+    """
+    Fetch many tickets by title with one IN query per TITLE_LOOKUP_CHUNK_SIZE
+    titles, instead of one round-trip per title.
+    Returns {title: ticket} for the titles that were found; missing titles are
+    omitted. Found tickets are cached per process as read-only mappings (see
+    get_ticket_from_db_by_title); on a database error the tickets found so far
+    are returned.
+    """
+    found = {}
+    missing = []
+    with _ticket_by_title_lock:
+        for title in dict.fromkeys(ticket_titles):
+            if not title:
+                continue
+            cached_ticket = _ticket_by_title_cache.get(title)
+            if cached_ticket is not None:
+                found[title] = cached_ticket
+            else:
+                missing.append(title)
+    if not missing:
+        logger.debug(f"Serving {len(found)} tickets from title cache.")
+        return found
+
+    from backend.db import engine as db_engine, connect as db_connect
     if db_engine is None:
-        logger.error("Database engine not available for get_ticket_from_db_by_title (db.py reported an issue).")
-        return None
-    if not ticket_title:
-        logger.warning("get_ticket_from_db_by_title called with empty title.")
-        return None
+        logger.error("Database engine not available for get_tickets_from_db_by_titles (db.py reported an issue).")
+        return found
     try:
-        with db_engine.connect() as conn:
-            result = conn.execute(
-                text("SELECT id, title, description, category, status, resolved_at, file_name, file_type, created_at FROM tickets WHERE title = :title LIMIT 1"),
-                {"title": ticket_title}
-            )
-            ticket_data = result.mappings().first()
-            if ticket_data:
-                logger.debug(f"Successfully fetched ticket by title: '{ticket_title}'. DB ID: {ticket_data.get('id', 'N/A')}")
-            else:
-                logger.warning(f"Ticket with title: '{ticket_title}' not found in DB.")
-            return ticket_data
+        with db_connect() as conn:
+            for start in range(0, len(missing), TITLE_LOOKUP_CHUNK_SIZE):
+                chunk = missing[start:start + TITLE_LOOKUP_CHUNK_SIZE]
+                rows_by_title, rows_by_folded_title = {}, {}
+                for row in conn.execute(_SELECT_TICKETS_BY_TITLES, {"titles": chunk}).mappings():
+                    # First row per title wins, like the former LIMIT 1; the case-folded
+                    # index covers databases that compare titles case-insensitively
+                    rows_by_title.setdefault(row['title'], row)
+                    rows_by_folded_title.setdefault(row['title'].casefold(), row)
+                for title in chunk:
+                    row = rows_by_title.get(title) or rows_by_folded_title.get(title.casefold())
+                    if row is None:
+                        logger.warning(f"Ticket with title: '{title}' not found in DB.")
+                        continue
+                    ticket_data = MappingProxyType(dict(row))
+                    with _ticket_by_title_lock:
+                        _ticket_by_title_cache[title] = ticket_data
+                    found[title] = ticket_data
+        logger.debug(f"Fetched {len(found)} of {len(found) + len(missing)} requested tickets by title.")
     except sqlalchemy_exc.SQLAlchemyError as db_err:
-        logger.error(f"Database error fetching ticket title '{ticket_title}': {db_err}", exc_info=True)
-        return None
+        logger.error(f"Database error fetching {len(missing)} tickets by title: {db_err}", exc_info=True)
     except Exception as e:
-        logger.error(f"Unexpected error fetching ticket title '{ticket_title}': {e}", exc_info=True)
+        logger.error(f"Unexpected error fetching {len(missing)} tickets by title: {e}", exc_info=True)
+    return found
+
+def get_ticket_from_db_by_title(ticket_title):
+    """
+    Fetch ticket from database using the title; None if not found or on error.
+    Found tickets are cached per process as read-only mappings; misses and
+    errors are not cached. Call get_ticket_from_db_by_title.cache_clear()
+    after writing to the tickets table.
+    """
+    if not ticket_title:
+        logger.warning("get_ticket_from_db_by_title called with empty title.")
         return None
+    return get_tickets_from_db_by_titles([ticket_title]).get(ticket_title)
+
+def _clear_ticket_by_title_cache():
+    with _ticket_by_title_lock:
+        _ticket_by_title_cache.clear()
+
+get_ticket_from_db_by_title.cache_clear = _clear_ticket_by_title_cache
+get_tickets_from_db_by_titles.cache_clear = _clear_ticket_by_title_cache
 
 def get_tickets_df():
-    """Fetch all tickets as DataFrame"""
-    from backend.db import engine as db_engine
+    """
+    Fetch all tickets as DataFrame.
+    Delegates to backend.db.get_tickets_df, which streams rows through a
+    server-side cursor (or connectorx when installed) and caches the result.
+    """
+    from backend.db import get_tickets_df as db_get_tickets_df
+    logger.info("Fetching all tickets into DataFrame for openai_agent via backend.db.")
+    return db_get_tickets_df()
+
+def _resolution_hours_sql(dialect_name):
+    """SQL expression for hours between created_at and resolved_at on the given dialect."""
+    if dialect_name in ('mysql', 'mariadb'):
+        return "TIMESTAMPDIFF(SECOND, created_at, resolved_at) / 3600.0"
+    if dialect_name == 'sqlite':
+        return "(julianday(resolved_at) - julianday(created_at)) * 24.0"
+    return "EXTRACT(EPOCH FROM (resolved_at - created_at)) / 3600.0"
+
+def _random_order_sql(dialect_name):
+    """ORDER BY expression that shuffles rows on the given dialect."""
+    return "RAND()" if dialect_name in ('mysql', 'mariadb') else "RANDOM()"
+
+def get_insights_frame(limit=500, random_sample=False):
+    """
+    Fetch only the columns generate_insights sends to the model, for the most
+    recent `limit` tickets, with resolution time computed in SQL for closed tickets.
+    With random_sample=True, returns `limit` tickets sampled uniformly in SQL instead.
+    """
+    import pandas as pd # Deferred: only insights need it, chat and categorization calls do not
+    from backend.db import engine as db_engine, connect as db_connect
     if db_engine is None:
-        logger.error("Database engine not available for get_tickets_df (db.py reported an issue).")
+        logger.error("Database engine not available for get_insights_frame (db.py reported an issue).")
         return pd.DataFrame()
-    logger.info("Attempting to fetch all tickets into DataFrame for openai_agent.")
+    query = text(f"""
+        SELECT title, category, status, created_at,
+               CASE WHEN status = 'Closed' AND resolved_at > created_at
+                    THEN {_resolution_hours_sql(db_engine.dialect.name)} END AS resolution_time_hours
+        FROM tickets
+        ORDER BY {_random_order_sql(db_engine.dialect.name) if random_sample else "created_at DESC"}
+        LIMIT :limit
+    """)
     try:
-        query = text("SELECT id, title, description, category, status, resolved_at, file_name, file_type, created_at FROM tickets ORDER BY created_at DESC")
-        with db_engine.connect() as conn:
-            df = pd.read_sql(query, conn)
-            logger.info(f"Successfully fetched {len(df)} tickets into DataFrame (openai_agent).")
+        with db_connect() as conn:
+            result = conn.execute(query, {"limit": limit})
+            df = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()))
+            if 'created_at' in df.columns:
+                # datetime64 lets to_csv format dates natively instead of calling str() per cell
+                df['created_at'] = pd.to_datetime(df['created_at'])
+            logger.info(f"Fetched {len(df)} tickets for insights (limit {limit}).")
             return df
     except sqlalchemy_exc.SQLAlchemyError as db_err:
-        logger.error(f"Database error fetching all tickets (openai_agent): {db_err}", exc_info=True)
+        logger.error(f"Database error fetching insights frame: {db_err}", exc_info=True)
         return pd.DataFrame()
     except Exception as e:
-        logger.error(f"Unexpected error fetching all tickets (openai_agent): {e}", exc_info=True)
+        logger.error(f"Unexpected error fetching insights frame: {e}", exc_info=True)
         return pd.DataFrame()
 
+def get_category_counts():
+    """Ticket counts per category, aggregated in SQL. Returns {} on error."""
+    from backend.db import engine as db_engine, connect as db_connect
+    if db_engine is None:
+        logger.error("Database engine not available for get_category_counts (db.py reported an issue).")
+        return {}
+    try:
+        with db_connect() as conn:
+            result = conn.execute(_SELECT_CATEGORY_COUNTS)
+            return {category if category is not None else 'Unknown': count for category, count in result}
+    except sqlalchemy_exc.SQLAlchemyError as db_err:
+        logger.error(f"Database error fetching category counts: {db_err}", exc_info=True)
+        return {}
+    except Exception as e:
+        logger.error(f"Unexpected error fetching category counts: {e}", exc_info=True)
+        return {}
+
 
 # --- OpenAI Generic API Call Function ---
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=6))
-def call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=500):
+def _retry_after_seconds(error, attempt):
+    """
+    Seconds to wait before retrying: the server's Retry-After when given, else
+    exponential backoff with full jitter, so sessions rate-limited together
+    do not all retry at the same instant.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(2 ** attempt, OPENAI_BACKOFF_MAX_SECONDS))
+
+
+def _create_with_retries(create, **params):
+    """
+    Calls a sync SDK create method, retrying transient errors up to
+    OPENAI_MAX_ATTEMPTS times (honouring Retry-After on 429s). Other errors
+    are raised immediately. A 429 pauses all requests, see _pause_requests.
+    """
+    for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+        pause_seconds = _seconds_until_unpaused()
+        if pause_seconds:
+            time.sleep(pause_seconds)
+        try:
+            return create(**params)
+        except _RETRYABLE_OPENAI_ERRORS as e:
+            if attempt == OPENAI_MAX_ATTEMPTS:
+                logger.error(f"OpenAI API call failed after {attempt} attempts: {e}", exc_info=True)
+                raise
+            wait_seconds = _retry_after_seconds(e, attempt)
+            logger.warning(f"OpenAI API call failed ({type(e).__name__}), retrying in {wait_seconds:.1f}s (attempt {attempt}/{OPENAI_MAX_ATTEMPTS}).")
+            if isinstance(e, openai.RateLimitError):
+                _pause_requests(wait_seconds) # Slept off at the top of the next attempt
+            else:
+                time.sleep(wait_seconds)
+        except Exception as e:
+            logger.error(f"OpenAI API call failed: {e}", exc_info=True)
+            raise
+
+
+def call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=500, response_format=None):
     """
     Generic OpenAI API caller with retry logic and model/param flexibility.
-    Accepts a list of prompt messages.
+    Accepts a list of prompt messages, and an optional response_format
+    (e.g. {"type": "json_object"}) passed through to the API.
+    Transient errors are retried up to OPENAI_MAX_ATTEMPTS times, waiting for
+    the server's Retry-After on 429s; other errors are raised immediately.
     """
     if client is None:
         logger.error("OpenAI client is not initialized. Cannot call API.")
         return "Error: OpenAI client not configured."
 
-    user_prompt_preview = ""
-    for msg in prompt_messages:
-        if msg["role"] == "user":
-            user_prompt_preview = msg["content"][:100]
-            break
-    logger.info(f"Calling OpenAI API with model {model}. User prompt preview: '{user_prompt_preview}...'")
+    # Lazy %-style arguments: nothing is sliced or formatted when INFO is filtered out
+    if logger.isEnabledFor(logging.INFO):
+        user_prompt_preview = next((msg["content"][:100] for msg in prompt_messages if msg["role"] == "user"), "")
+        logger.info("Calling OpenAI API with model %s. User prompt preview: '%s...'", model, user_prompt_preview)
 
-    try:
-        response = client.chat.completions.create(
+    extra_params = {"response_format": response_format} if response_format else {}
+    with _request_slots:
+        response = _create_with_retries(
+            client.chat.completions.create,
             model=model,
             messages=prompt_messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            **extra_params
         )
-        content = response.choices[0].message.content.strip()
-        log_response_len = min(len(content), 200)
-        logger.info(f"Received OpenAI response. Length: {len(content)}. First {log_response_len} chars: '{content[:log_response_len]}{'...' if len(content) > log_response_len else ''}'")
-        if not content:
-             logger.warning("OpenAI API returned an empty response.")
-        return content
-    except Exception as e:
-        logger.error(f"OpenAI API call failed: {e}", exc_info=True)
-        raise
+    content = response.choices[0].message.content.strip()
+    logger.info("Received OpenAI response. Length: %d.", len(content))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenAI response head: '%s%s'", content[:200], '...' if len(content) > 200 else '')
+    if not content:
+         logger.warning("OpenAI API returned an empty response.")
+    return content
+
+
+def call_openai_api_stream(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=500):
+    """
+    Streaming counterpart of call_openai_api: yields response text deltas as
+    they arrive, e.g. for st.write_stream. Opening the stream is retried like
+    call_openai_api; an error mid-stream is raised to the consumer. A request
+    slot is held until the stream is exhausted or the generator is closed.
+    Use call_openai_api where the full response must be parsed first.
+    """
+    if client is None:
+        logger.error("OpenAI client is not initialized. Cannot call API.")
+        yield "Error: OpenAI client not configured."
+        return
+
+    logger.info("Streaming OpenAI API response with model %s.", model)
+    streamed_chars = 0
+    with _request_slots:
+        stream = _create_with_retries(
+            client.chat.completions.create,
+            model=model,
+            messages=prompt_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        with stream:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    streamed_chars += len(delta)
+                    yield delta
+    logger.info("Finished OpenAI response stream. Length: %d.", streamed_chars)
+
+
+def _estimate_request_tokens(prompt_messages, max_tokens):
+    """Rough token cost of a request for the rate limiter: ~4 chars per prompt token plus the completion budget."""
+    return sum(len(msg["content"]) for msg in prompt_messages) // 4 + max_tokens
+
+
+async def call_openai_api_async(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=500, semaphore=None, response_format=None):
+    """
+    Async counterpart of call_openai_api using the event loop's AsyncOpenAI
+    client (see _with_async_client; a one-off client is opened when awaited
+    outside the module's entry points). If a semaphore is given, the request holds it while in flight to cap concurrency.
+    Requests are throttled by the shared AsyncRateLimiter. 429s pause all
+    requests for the server's Retry-After, connection errors and 5xx back off exponentially,
+    and other 4xx errors are raised without retrying.
+    """
+    if _async_client_factory is None:
+        logger.error("Async OpenAI client is not initialized. Cannot call API.")
+        return "Error: OpenAI client not configured."
+    aclient = _loop_aclient.get()
+    if aclient is None:
+        return await _with_async_client(call_openai_api_async(
+            prompt_messages, model=model, temperature=temperature, max_tokens=max_tokens,
+            semaphore=semaphore, response_format=response_format
+        ))
+
+    extra_params = {"response_format": response_format} if response_format else {}
+
+    async def _create():
+        return await aclient.chat.completions.create(
+            model=model,
+            messages=prompt_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **extra_params
+        )
+
+    async def _limited_create():
+        pause_seconds = _seconds_until_unpaused()
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+        await _rate_limiter.acquire(_estimate_request_tokens(prompt_messages, max_tokens))
+        return await _create()
+
+    for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+        try:
+            if semaphore is not None:
+                async with semaphore:
+                    response = await _limited_create()
+            else:
+                response = await _limited_create()
+            content = response.choices[0].message.content.strip()
+            logger.info(f"Received async OpenAI response. Length: {len(content)}.")
+            if not content:
+                 logger.warning("OpenAI API returned an empty response.")
+            return content
+        except _RETRYABLE_OPENAI_ERRORS as e:
+            if attempt == OPENAI_MAX_ATTEMPTS:
+                logger.error(f"Async OpenAI API call failed after {attempt} attempts: {e}", exc_info=True)
+                raise
+            wait_seconds = _retry_after_seconds(e, attempt)
+            logger.warning(f"Async OpenAI API call failed ({type(e).__name__}), retrying in {wait_seconds:.1f}s (attempt {attempt}/{OPENAI_MAX_ATTEMPTS}).")
+            if isinstance(e, openai.RateLimitError):
+                _pause_requests(wait_seconds) # Slept off before the next attempt is sent
+            else:
+                await asyncio.sleep(wait_seconds)
+        except Exception as e:
+            logger.error(f"Async OpenAI API call failed: {e}", exc_info=True)
+            raise
+
+
+DEFAULT_CATEGORIES = [
+    "Network Security", "Phishing Attack", "Malware Infection",
+    "Access Control", "Policy Violation", "Data Leak",
+    "Hardware Issue", "Software Issue", "Other"
+]
+
+
+_LIST_PREFIX_RE = re.compile(r"^\s*\d+\.?\s*[:\-]?\s*") # "3. ", "3: ", "3 - " numbering the model may add
+
+
+@functools.lru_cache(maxsize=64)
+def _category_lookup(categories):
+    """
+    (frozenset, compiled pattern) for a category tuple; built once per distinct list.
+    The pattern matches any category as a whole word, case-insensitively,
+    trying longer names first so "Network Security" beats a shorter overlap.
+    """
+    alternatives = "|".join(re.escape(category) for category in sorted(categories, key=len, reverse=True))
+    return frozenset(categories), re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=64)
+def _canonical_categories(category_set):
+    """Case-folded name -> canonical category, for mapping case-insensitive regex hits back."""
+    return {category.casefold(): category for category in category_set}
+
+
+def _match_category(llm_output_line, category_set, category_pattern):
+    """
+    Maps one line of LLM output to a known category.
+    Returns (cleaned_text, category), where category is None if nothing matched.
+    An exact match wins; otherwise the first known category found in the line.
+    """
+    if llm_output_line in category_set: # Common case: the model returned a category verbatim
+        return llm_output_line, llm_output_line
+    simple_cleaned_cat_text = _LIST_PREFIX_RE.sub("", llm_output_line).strip()
+    if simple_cleaned_cat_text in category_set:
+        return simple_cleaned_cat_text, simple_cleaned_cat_text
+    found = category_pattern.search(simple_cleaned_cat_text)
+    if found is None:
+        return simple_cleaned_cat_text, None
+    return simple_cleaned_cat_text, _canonical_categories(category_set)[found.group(0).casefold()]
+
+
+# Identical across requests for the same category list (no per-batch numbers), so
+# every categorization call shares one prompt prefix and is eligible for
+# OpenAI's automatic prompt caching. The ticket count goes in the user message.
+_CATEGORIZATION_SYSTEM_PROMPT_TEMPLATE = """You are an IT ticket categorization AI. Your sole task is to classify IT tickets.
+Each ticket is provided in the user message, separated by '---'. The user message states how many tickets it contains.
+For EACH input ticket, you MUST assign EXACTLY ONE category, in the order the tickets are given.
+Use ONLY categories from this list: {category_list}.
+If a ticket is unclear or doesn't fit, use 'Other'.
+
+Respond with a JSON object with a single key "categories" whose value is an array
+containing exactly one category name per ticket. NO other keys. NO explanations.
+
+Example of expected output format if you were given 3 tickets:
+{{"categories": ["Phishing Attack", "Network Security", "Other"]}}
+"""
+_CATEGORIZATION_USER_PROMPT_TEMPLATE = """There are {num_tickets} tickets below. Provide a "categories" array of exactly {num_tickets} category names.
+---
+{tickets}"""
+CATEGORIZATION_CHUNK_SIZE = 20 # Tickets per request when a large input is split up
+CATEGORIZATION_CONTEXT_TOKENS = 16385 # Smallest context window among the supported categorizer models
+CATEGORIZATION_CONTEXT_RESERVE_TOKENS = 512 # Headroom for message framing and estimate error
+CATEGORIZATION_MAX_TICKET_TOKENS = 1500 # Longer tickets are truncated; the start is enough to classify
+# Inputs above this many tickets are routed to the Batch API; 0 (the default) never routes automatically
+CATEGORIZATION_BATCH_API_THRESHOLD = int(os.getenv("CATEGORIZATION_BATCH_API_THRESHOLD", "0"))
+# JSON mode guarantees a parseable object, so formatting drift (numbering, blank
+# lines, stray prose) no longer turns into Count Mismatch retries
+CATEGORIZATION_RESPONSE_FORMAT = {"type": "json_object"}
+
+
+@functools.lru_cache(maxsize=64)
+def _categorization_system_prompt(categories):
+    """Formats the categorization system prompt; memoized per category tuple."""
+    return _CATEGORIZATION_SYSTEM_PROMPT_TEMPLATE.format(category_list=', '.join(categories))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_token_encoder():
+    """Returns the tiktoken encoder for the categorization model, or None if unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(CATEGORIZER_MODEL)
+    except Exception as e: # Missing package, or the BPE file could not be fetched
+        logger.warning(f"tiktoken encoder unavailable, falling back to estimated token counts: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _category_token_cost(category):
+    """Tokens needed to emit one category as a quoted JSON array element."""
+    encoded = json.dumps(category) + ", "
+    encoder = _get_token_encoder()
+    if encoder is None:
+        return len(encoded) // 3 + 2 # Rough chars-per-token estimate
+    return len(encoder.encode(encoded))
+
+
+def _count_tokens(text):
+    """Token count of text for the categorization model (estimated when tiktoken is unavailable)."""
+    encoder = _get_token_encoder()
+    if encoder is None:
+        return len(text) // 3 + 1
+    return len(encoder.encode(text))
+
+
+def _truncate_to_tokens(text, max_tokens):
+    """Returns (text, token_count), cutting text down to at most max_tokens tokens."""
+    encoder = _get_token_encoder()
+    if encoder is None:
+        text = text[:max_tokens * 3]
+        return text, len(text) // 3 + 1
+    tokens = encoder.encode(text)
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return encoder.decode(tokens[:max_tokens]), max_tokens
+
+
+@functools.lru_cache(maxsize=64)
+def _categorization_token_costs(categories):
+    """
+    (system prompt tokens, output tokens per ticket) for a category tuple, counted
+    once: the longest category's JSON element plus 2 tokens of whitespace slack.
+    """
+    output_tokens_per_ticket = max(_category_token_cost(category) for category in categories) + 2
+    return _count_tokens(_categorization_system_prompt(categories)), output_tokens_per_ticket
+
+
+def _pack_categorization_chunks(token_counts, categories, chunk_size):
+    """
+    Greedily packs ticket indices, shortest first, into chunks of at most
+    chunk_size tickets whose prompt and expected output fit the model context.
+    Returns a list of index lists.
+    """
+    system_tokens, output_tokens_per_ticket = _categorization_token_costs(tuple(categories))
+    token_budget = CATEGORIZATION_CONTEXT_TOKENS - CATEGORIZATION_CONTEXT_RESERVE_TOKENS - system_tokens
+    index_chunks = []
+    current_chunk, current_tokens = [], 0
+    for i in sorted(range(len(token_counts)), key=token_counts.__getitem__):
+        ticket_tokens = token_counts[i] + 2 + output_tokens_per_ticket # +2 for the '---' separator
+        if current_chunk and (len(current_chunk) >= chunk_size or current_tokens + ticket_tokens > token_budget):
+            index_chunks.append(current_chunk)
+            current_chunk, current_tokens = [], 0
+        current_chunk.append(i)
+        current_tokens += ticket_tokens
+    if current_chunk:
+        index_chunks.append(current_chunk)
+    return index_chunks
+
+
+def _build_categorization_request(texts, categories):
+    """Returns (prompt_messages, max_tokens) for categorizing texts in one request."""
+    num_tickets = len(texts)
+    prompt_messages = [
+        {"role": "system", "content": _categorization_system_prompt(tuple(categories))},
+        {"role": "user", "content": _CATEGORIZATION_USER_PROMPT_TEMPLATE.format(num_tickets=num_tickets, tickets="---\n".join(texts))}
+    ]
+    # Exact bound: per-ticket element cost times the ticket count, plus a fixed
+    # allowance for the {"categories": [...]} wrapper. Chunks are packed to fit the
+    # context, so no clamp is needed (one would only truncate the JSON array)
+    _, output_tokens_per_ticket = _categorization_token_costs(tuple(categories))
+    max_tokens_for_output = num_tickets * output_tokens_per_ticket + 10
+    return prompt_messages, max_tokens_for_output
+
+
+def _parse_categorization_response(raw_categories_response, texts, categories):
+    """Maps the LLM's {"categories": [...]} JSON response onto texts, or returns error strings."""
+    num_tickets = len(texts)
+    category_set, category_pattern = _category_lookup(tuple(categories))
+    if raw_categories_response.startswith("Error:"):
+         logger.error(f"call_openai_api returned an error: {raw_categories_response}")
+         return [raw_categories_response] * num_tickets
+
+    try:
+        assigned_categories_from_llm = json.loads(raw_categories_response)["categories"]
+        if not isinstance(assigned_categories_from_llm, list):
+            raise TypeError(f"'categories' is a {type(assigned_categories_from_llm).__name__}, not a list")
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        logger.error(f"Could not parse categorization JSON ({e}). Raw response was: '{raw_categories_response}'")
+        return ["Error: Invalid JSON"] * num_tickets
+    assigned_categories_from_llm = [str(category).strip() for category in assigned_categories_from_llm]
+
+    num_received = len(assigned_categories_from_llm)
+
+    if num_received != num_tickets:
+        logger.error(
+            f"FATAL: Mismatched category count after parsing! Expected {num_tickets}, got {num_received}. "
+            f"Input texts count: {len(texts)}. Raw response was: '{raw_categories_response}'"
+        )
+        logger.debug(f"Parsed lines ({num_received}): {assigned_categories_from_llm}")
+        return ["Error: Count Mismatch"] * num_tickets
+
+    # JSON mode almost always returns the names verbatim: one set check replaces the per-line matching loop
+    if category_set.issuperset(assigned_categories_from_llm):
+        logger.info(f"Successfully processed and finalized {num_tickets} categories for {num_tickets} tickets.")
+        return assigned_categories_from_llm
+
+    final_categories = []
+    mismatched_category_names_count = 0
+    for i, llm_output_line in enumerate(assigned_categories_from_llm):
+        simple_cleaned_cat_text, best_match_found = _match_category(llm_output_line, category_set, category_pattern)
+        if best_match_found and best_match_found != simple_cleaned_cat_text:
+            logger.warning(
+                f"Ticket {i+1}/{num_tickets}: LLM output line '{llm_output_line}' (cleaned to '{simple_cleaned_cat_text}') was not an exact category. "
+                f"Extracted known category '{best_match_found}' by substring match."
+            )
+
+        if best_match_found:
+            final_categories.append(best_match_found)
+        else:
+            logger.warning(
+                f"Ticket {i+1}/{num_tickets}: LLM output line '{llm_output_line}' (cleaned to '{simple_cleaned_cat_text}') did not match or contain any known categories: {categories}. "
+                f"Assigning 'Other'."
+            )
+            final_categories.append("Other")
+            mismatched_category_names_count += 1
+
+    if mismatched_category_names_count > 0:
+         logger.info(f"{mismatched_category_names_count} out of {num_tickets} tickets were assigned 'Other' due to mismatch or unidentifiable category names from LLM.")
+
+    logger.info(f"Successfully processed and finalized {len(final_categories)} categories for {num_tickets} tickets.")
+    return final_categories
+
+
+async def _categorize_chunk_async(texts, categories, semaphore):
+    """Categorizes one chunk of texts with a single async request."""
+    prompt_messages, max_tokens_for_output = _build_categorization_request(texts, categories)
+    raw_categories_response = await call_openai_api_async(
+        prompt_messages, model=CATEGORIZER_MODEL, temperature=0.0, max_tokens=max_tokens_for_output,
+        semaphore=semaphore, response_format=CATEGORIZATION_RESPONSE_FORMAT
+    )
+    return _parse_categorization_response(raw_categories_response, texts, categories)
+
+
+async def _categorize_chunks_async(texts, categories, index_chunks):
+    """
+    Categorizes each chunk of text indices concurrently (see
+    _pack_categorization_chunks) and reassembles results in input order.
+    """
+    logger.info(f"Categorizing {len(texts)} tickets in {len(index_chunks)} concurrent requests.")
+    semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    chunk_results = await asyncio.gather(*(
+        _categorize_chunk_async([texts[i] for i in chunk], categories, semaphore) for chunk in index_chunks
+    ))
+    final_categories = [None] * len(texts)
+    for chunk, chunk_categories in zip(index_chunks, chunk_results):
+        for original_index, category in zip(chunk, chunk_categories):
+            final_categories[original_index] = category
+    return final_categories
 
 
 # --- UPDATED BATCH CATEGORIZATION FUNCTION ---
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=6))
-def categorize_ticket_batch(texts, categories=None):
+def categorize_ticket_batch(texts, categories=None, chunk_size=CATEGORIZATION_CHUNK_SIZE, background=False):
     """
     Categorize multiple tickets efficiently using OpenAI with improved prompt,
     robust parsing, and cost-aware settings.
+    Tickets are truncated to CATEGORIZATION_MAX_TICKET_TOKENS and packed by
+    token count into requests of at most chunk_size that fit the model
+    context; multiple requests run concurrently and share the same system prompt.
+    Tickets categorized before (same normalized text, model and categories)
+    are served from category_cache, and identical tickets in one batch share a
+    single LLM slot. When LOCAL_CATEGORIZER is enabled, tickets the local
+    embedding classifier resolves with a clear margin never reach the API.
+    With background=True, or more than CATEGORIZATION_BATCH_API_THRESHOLD
+    tickets, the LLM work goes through submit_categorization_batch instead
+    (discounted, but can take up to 24h).
     """
     if client is None:
         logger.error("OpenAI client is not initialized. Cannot categorize tickets.")
@@ -130,132 +808,192 @@ def categorize_ticket_batch(texts, categories=None):
     num_tickets = len(texts)
 
     if not categories:
-        categories = [
-            "Network Security", "Phishing Attack", "Malware Infection",
-            "Access Control", "Policy Violation", "Data Leak",
-            "Hardware Issue", "Software Issue", "Other"
-        ]
-    sorted_categories_for_matching = sorted(categories, key=len, reverse=True)
+        categories = DEFAULT_CATEGORIES
 
     logger.info(f"Attempting to categorize {num_tickets} tickets using categories: {categories}")
 
-    # Refined prompt
-    system_prompt = f"""You are an IT ticket categorization AI. Your sole task is to classify {num_tickets} IT tickets.
-Each ticket is provided in the user message, separated by '---'.
-For EACH of the {num_tickets} input tickets, you MUST output EXACTLY ONE category on a new line.
-Use ONLY categories from this list: {', '.join(categories)}.
-If a ticket is unclear or doesn't fit, use 'Other'.
-
-Your response MUST contain exactly {num_tickets} lines.
-NO other text. NO explanations. NO numbering. NO blank lines.
-ONLY one category name per line.
+    try:
+        hashes = [category_cache.content_hash(ticket_text, CATEGORIZER_MODEL, categories) for ticket_text in texts]
+        cached = category_cache.get_many(hashes)
+        final_categories = [cached.get(h) for h in hashes]
+        pending = [i for i, category in enumerate(final_categories) if category is None]
+        if pending:
+            for i, category in zip(pending, classify_locally([texts[i] for i in pending], categories)):
+                final_categories[i] = category
+        unresolved = [i for i in pending if final_categories[i] is None]
+        if unresolved:
+            first_by_hash = {}
+            for i in unresolved:
+                first_by_hash.setdefault(hashes[i], i)
+            unique_texts = [texts[i] for i in first_by_hash.values()]
+            use_batch_api = background or 0 < CATEGORIZATION_BATCH_API_THRESHOLD < len(unique_texts)
+            if use_batch_api:
+                llm_categories = submit_categorization_batch(unique_texts, categories)
+            else:
+                llm_categories = _categorize_with_llm(unique_texts, categories, chunk_size)
+            by_hash = dict(zip(first_by_hash, llm_categories))
+            for i in unresolved:
+                final_categories[i] = by_hash[hashes[i]]
+            # 'Other' is also the fallback for unparseable model output, so it is not cached
+            category_cache.put_many(
+                {h: category for h, category in by_hash.items() if category in categories and category != "Other"},
+                CATEGORIZER_MODEL
+            )
+        return final_categories
 
-Example of expected output format if you were given 3 tickets (where num_tickets would be 3):
-Phishing Attack
-Network Security
-Other
+    except Exception as e:
+        logger.error(f"Batch categorization API call or response processing failed unexpectedly: {e}", exc_info=True)
+        raise
 
-Confirm: You will provide exactly {num_tickets} lines of output, each containing only a category name.
-"""
-    user_prompt_content = "---\n".join(texts)
-    
-    prompt_messages_for_api = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt_content}
-    ]
 
-    estimated_output_tokens_per_ticket = 10
-    max_tokens_for_output = num_tickets * estimated_output_tokens_per_ticket
-    max_tokens_for_output = max(50, max_tokens_for_output)
-    max_tokens_for_output = min(max_tokens_for_output, 1500)
+def _categorize_with_llm(texts, categories, chunk_size):
+    """LLM path of categorize_ticket_batch: truncate, pack by tokens, then one or many requests."""
+    truncated = [_truncate_to_tokens(ticket_text, CATEGORIZATION_MAX_TICKET_TOKENS) for ticket_text in texts]
+    texts = [ticket_text for ticket_text, _ in truncated]
+    if _is_completions_model(CATEGORIZER_MODEL):
+        return _categorize_with_completions(texts, categories)
+    index_chunks = _pack_categorization_chunks([token_count for _, token_count in truncated], categories, chunk_size)
+    if len(index_chunks) > 1:
+        return asyncio.run(_with_async_client(_categorize_chunks_async(texts, categories, index_chunks)))
 
+    prompt_messages_for_api, max_tokens_for_output = _build_categorization_request(texts, categories)
     logger.info(f"Setting max_tokens for OpenAI completion to: {max_tokens_for_output}")
+    raw_categories_response = call_openai_api(
+        prompt_messages=prompt_messages_for_api,
+        model=CATEGORIZER_MODEL,
+        temperature=0.0,
+        max_tokens=max_tokens_for_output,
+        response_format=CATEGORIZATION_RESPONSE_FORMAT
+    )
+    return _parse_categorization_response(raw_categories_response, texts, categories)
+
+
+# --- Prompt-List Categorization (legacy completions endpoint) ---
+COMPLETIONS_PROMPTS_PER_REQUEST = 100 # One RPM slot covers this many tickets
+
+
+@functools.lru_cache(maxsize=64)
+def _single_ticket_instruction(categories):
+    """Instruction for classifying one ticket per request; shared by the completions and Batch API paths."""
+    return (
+        "You are an IT ticket categorization AI. Classify the IT ticket in the user message.\n"
+        f"Use ONLY one category from this list: {', '.join(categories)}.\n"
+        "If the ticket is unclear or doesn't fit, use 'Other'.\n"
+        "Respond with the category name only. NO other text."
+    )
 
-    try:
-        raw_categories_response = call_openai_api(
-            prompt_messages=prompt_messages_for_api,
-            model="gpt-3.5-turbo",
-            temperature=0.0,
-            max_tokens=max_tokens_for_output
-        )
-        if "Error:" in raw_categories_response :
-             logger.error(f"call_openai_api returned an error: {raw_categories_response}")
-             return [raw_categories_response] * num_tickets
 
-        parsed_lines = [line.strip() for line in raw_categories_response.splitlines()]
-        assigned_categories_from_llm = [line for line in parsed_lines if line]
+def _is_completions_model(model):
+    """Instruct models are served by /v1/completions, which accepts a list of prompts per request."""
+    return model.endswith("-instruct")
 
-        num_received = len(assigned_categories_from_llm)
 
-        if num_received != num_tickets:
-            logger.error(
-                f"FATAL: Mismatched category count after parsing! Expected {num_tickets}, got {num_received}. "
-                f"Input texts count: {len(texts)}. Raw response was: '{raw_categories_response}'"
+def _categorize_with_completions(texts, categories):
+    """
+    Categorizes with one prompt per ticket, sending up to
+    COMPLETIONS_PROMPTS_PER_REQUEST prompts in a single completions request.
+    Each ticket gets its own generation budget and answer (matched back by
+    choice.index), so there is no multi-ticket output to split or count.
+    """
+    category_set, category_pattern = _category_lookup(tuple(categories))
+    instruction = _single_ticket_instruction(tuple(categories))
+    _, max_tokens = _categorization_token_costs(tuple(categories))
+    final_categories = []
+    for start in range(0, len(texts), COMPLETIONS_PROMPTS_PER_REQUEST):
+        prompts = [f"{instruction}\n\nTicket:\n{ticket_text}\n\nCategory:"
+                   for ticket_text in texts[start:start + COMPLETIONS_PROMPTS_PER_REQUEST]]
+        with _request_slots:
+            response = _create_with_retries(
+                client.completions.create,
+                model=CATEGORIZER_MODEL,
+                prompt=prompts,
+                temperature=0.0,
+                max_tokens=max_tokens,
+                stop=["\n"]
             )
-            logger.debug(f"Parsed lines ({num_received}): {assigned_categories_from_llm}")
-            return ["Error: Count Mismatch"] * num_tickets
+        answers = [""] * len(prompts)
+        for choice in response.choices:
+            answers[choice.index] = choice.text.strip()
+        for answer in answers:
+            _, matched_category = _match_category(answer, category_set, category_pattern)
+            final_categories.append(matched_category or "Other")
+    logger.info(f"Categorized {len(texts)} tickets via {CATEGORIZER_MODEL} prompt-list completions.")
+    return final_categories
 
-        final_categories = []
-        mismatched_category_names_count = 0
-        for i, llm_output_line in enumerate(assigned_categories_from_llm):
-            simple_cleaned_cat_text = re.sub(r"^\s*\d+\.?\s*[:\-]?\s*", "", llm_output_line).strip()
-            best_match_found = None
 
-            if simple_cleaned_cat_text in categories:
-                best_match_found = simple_cleaned_cat_text
-            else:
-                for known_cat in sorted_categories_for_matching:
-                    if known_cat in simple_cleaned_cat_text:
-                        best_match_found = known_cat
-                        logger.warning(
-                            f"Ticket {i+1}/{num_tickets}: LLM output line '{llm_output_line}' (cleaned to '{simple_cleaned_cat_text}') was not an exact category. "
-                            f"Extracted known category '{known_cat}' by substring match."
-                        )
-                        break
-            
-            if best_match_found:
-                final_categories.append(best_match_found)
-            else:
-                logger.warning(
-                    f"Ticket {i+1}/{num_tickets}: LLM output line '{llm_output_line}' (cleaned to '{simple_cleaned_cat_text}') did not match or contain any known categories: {categories}. "
-                    f"Assigning 'Other'."
-                )
-                final_categories.append("Other")
-                mismatched_category_names_count += 1
+# --- OpenAI Batch API Categorization (offline / bulk backfills) ---
+def submit_categorization_batch(texts, categories=None, model=CATEGORIZER_MODEL, poll_interval_seconds=30, timeout_seconds=24 * 3600):
+    """
+    Categorizes tickets through the OpenAI Batch API: one request per ticket,
+    uploaded as a JSONL file and collected once the batch completes.
+    Batch requests are billed at a discount and have separate rate limits, but
+    can take up to 24h, so this is for bulk runs; interactive paths should keep
+    using categorize_ticket_batch.
+    Returns a list of categories aligned with texts, or error strings on failure.
+    """
+    if client is None:
+        logger.error("OpenAI client is not initialized. Cannot submit categorization batch.")
+        return ["Error: OpenAI Not Configured"] * len(texts) if texts else []
+    if not texts:
+        logger.warning("submit_categorization_batch called with empty list of texts.")
+        return []
 
-        if mismatched_category_names_count > 0:
-             logger.info(f"{mismatched_category_names_count} out of {num_tickets} tickets were assigned 'Other' due to mismatch or unidentifiable category names from LLM.")
+    categories = categories or DEFAULT_CATEGORIES
+    category_set, category_pattern = _category_lookup(tuple(categories))
+    system_prompt = _single_ticket_instruction(tuple(categories))
+    _, max_tokens = _categorization_token_costs(tuple(categories))
+    texts = [_truncate_to_tokens(ticket_text, CATEGORIZATION_MAX_TICKET_TOKENS)[0] for ticket_text in texts]
 
-        logger.info(f"Successfully processed and finalized {len(final_categories)} categories for {num_tickets} tickets.")
-        return final_categories
+    request_bodies = [
+        (f"t{i}", {
+            "model": model,
+            "temperature": 0.0,
+            "max_tokens": max_tokens,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": ticket_text}
+            ]
+        })
+        for i, ticket_text in enumerate(texts)
+    ]
 
+    try:
+        batch_id = submit_batch(client, request_bodies)
+        outputs = wait_for_batch(client, batch_id, poll_interval_seconds, timeout_seconds)
+    except BatchError as e:
+        logger.error(f"Categorization batch did not complete: {e}")
+        return ["Error: Batch Failed"] * len(texts)
     except Exception as e:
-        logger.error(f"Batch categorization API call or response processing failed unexpectedly: {e}", exc_info=True)
-        raise
+        logger.error(f"OpenAI Batch API categorization failed: {e}", exc_info=True)
+        return ["Error: Batch API Failure"] * len(texts)
 
+    # Requests that failed inside the batch (non-200 or absent from the output
+    # file) get an error marker like the sync path, so callers leave them Pending
+    final_categories = ["Error: Batch Request Failed"] * len(texts)
+    for custom_id, llm_output_line in outputs.items():
+        _, matched_category = _match_category(llm_output_line, category_set, category_pattern)
+        final_categories[int(custom_id[1:])] = matched_category or "Other"
 
-# --- Functions for Summary, Resolution, Insights (Using the generic API caller) ---
-def get_ticket_summary(ticket_title):
-    logger.info(f"--- Entering get_ticket_summary for ticket_title: '{ticket_title}' ---")
-    ticket = get_ticket_from_db_by_title(ticket_title)
-    if not ticket:
-        logger.warning(f"get_ticket_summary: Ticket '{ticket_title}' not found.")
-        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+    failed_count = len(texts) - len(outputs)
+    if failed_count:
+        logger.warning(f"{failed_count} of {len(texts)} requests in batch {batch_id} returned no result.")
+    logger.info(f"Collected {len(outputs)} categories from batch {batch_id}.")
+    return final_categories
 
-    category = ticket.get('category', 'N/A')
-    title_val = ticket.get('title', 'N/A')
-    description = ticket.get('description', 'No description available.')
-    logger.info(f"get_ticket_summary: Fetched data for ticket '{ticket_title}'. DB ID: {ticket.get('id')}, Category: {category}")
 
-    system_message_summary = "You are an expert at summarizing IT support tickets."
-    user_message_summary = f"""
+# --- Functions for Summary, Resolution, Insights (Using the generic API caller) ---
+# Module-level templates: a plain str.format per call instead of rebuilding each body.
+# System messages are constants, so every request shares a byte-identical prefix
+# that the API's automatic prompt caching can match.
+_SUMMARY_SYSTEM_MESSAGE = "You are an expert at summarizing IT support tickets."
+_SUMMARY_PROMPT_TEMPLATE = """
     Please summarize the key information from the following IT support ticket.
     The ticket is in the '{category}' category.
 
-    Ticket Title: {title_val}
+    Ticket Title: {title}
     Full Description (first 1000 characters):
     ---
-    {description[:1000]}
+    {description}
     ---
 
     Provide the summary as exactly 3 concise bullet points, focusing on the core issue and context.
@@ -264,37 +1002,38 @@ def get_ticket_summary(ticket_title):
     - [Issue or observation 2]
     - [Relevant detail or impact 3]
     """
-    prompt_messages = [
-        {"role": "system", "content": system_message_summary},
-        {"role": "user", "content": user_message_summary}
-    ]
-    
-    summary_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.2, max_tokens=200)
-    logger.info(f"--- Exiting get_ticket_summary for ticket_title: '{ticket_title}' ---")
-    return summary_response
-
 
-def get_ticket_resolution(ticket_title):
-    logger.info(f"--- Entering get_ticket_resolution for ticket_title: '{ticket_title}' ---")
-    ticket = get_ticket_from_db_by_title(ticket_title)
-    if not ticket:
-        logger.warning(f"get_ticket_resolution: Ticket '{ticket_title}' not found.")
-        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
 
+def _build_summary_messages(ticket):
+    """Builds the chat messages asking for a 3-bullet summary of a ticket row."""
     category = ticket.get('category', 'N/A')
     title_val = ticket.get('title', 'N/A')
     description = ticket.get('description', 'No description available.')
-    logger.info(f"get_ticket_resolution: Fetched data for ticket '{ticket_title}'. DB ID: {ticket.get('id')}, Category: {category}")
 
-    system_message_resolution = "You are an expert IT support specialist providing resolution steps."
-    user_message_resolution = f"""
+    user_message_summary = _SUMMARY_PROMPT_TEMPLATE.format(
+        category=category, title=title_val, description=description[:1000]
+    )
+    return [
+        {"role": "system", "content": _SUMMARY_SYSTEM_MESSAGE},
+        {"role": "user", "content": user_message_summary}
+    ]
+
+
+# Completion budgets per purpose; latency grows with generated tokens, so each is
+# sized to its format rather than sharing one generous default
+SUMMARY_MAX_TOKENS = 160     # Exactly 3 short bullet points
+RESOLUTION_MAX_TOKENS = 700  # Four headed sections of steps
+
+
+_RESOLUTION_SYSTEM_MESSAGE = "You are an expert IT support specialist providing resolution steps."
+_RESOLUTION_PROMPT_TEMPLATE = """
     Analyze the following support ticket and provide clear, actionable resolution steps.
     The ticket category is '{category}'.
 
-    Ticket Title: {title_val}
+    Ticket Title: {title}
     Full Description (first 1500 characters):
     ---
-    {description[:1500]}
+    {description}
     ---
 
     Provide detailed steps organized under the following headings. Be specific and practical.
@@ -324,51 +1063,246 @@ def get_ticket_resolution(ticket_title):
     - [Tip 2]
     ...
     """
-    prompt_messages = [
-        {"role": "system", "content": system_message_resolution},
+
+
+def _build_resolution_messages(ticket):
+    """Builds the chat messages asking for structured resolution steps for a ticket row."""
+    category = ticket.get('category', 'N/A')
+    title_val = ticket.get('title', 'N/A')
+    description = ticket.get('description', 'No description available.')
+
+    user_message_resolution = _RESOLUTION_PROMPT_TEMPLATE.format(
+        category=category, title=title_val, description=description[:1500]
+    )
+    return [
+        {"role": "system", "content": _RESOLUTION_SYSTEM_MESSAGE},
         {"role": "user", "content": user_message_resolution}
     ]
 
-    resolution_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=700)
+
+def get_ticket_summary(ticket_title, ticket=None):
+    """
+    Returns the model's summary for the ticket with this title, or an error/not-found string.
+    Pass a ticket row already fetched (e.g. via get_tickets_from_db_by_titles) to skip the lookup.
+    """
+    logger.info(f"--- Entering get_ticket_summary for ticket_title: '{ticket_title}' ---")
+    if ticket is None:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+    if not ticket:
+        logger.warning(f"get_ticket_summary: Ticket '{ticket_title}' not found.")
+        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+
+    logger.info(f"get_ticket_summary: Fetched data for ticket '{ticket_title}'. DB ID: {ticket.get('id')}, Category: {ticket.get('category', 'N/A')}")
+    prompt_messages = _build_summary_messages(ticket)
+
+    summary_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.2, max_tokens=SUMMARY_MAX_TOKENS)
+    logger.info(f"--- Exiting get_ticket_summary for ticket_title: '{ticket_title}' ---")
+    return summary_response
+
+
+def get_ticket_resolution(ticket_title, ticket=None):
+    """
+    Returns the model's resolution for the ticket with this title, or an error/not-found string.
+    Pass a ticket row already fetched (e.g. via get_tickets_from_db_by_titles) to skip the lookup.
+    """
+    logger.info(f"--- Entering get_ticket_resolution for ticket_title: '{ticket_title}' ---")
+    if ticket is None:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+    if not ticket:
+        logger.warning(f"get_ticket_resolution: Ticket '{ticket_title}' not found.")
+        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+
+    logger.info(f"get_ticket_resolution: Fetched data for ticket '{ticket_title}'. DB ID: {ticket.get('id')}, Category: {ticket.get('category', 'N/A')}")
+    prompt_messages = _build_resolution_messages(ticket)
+
+    resolution_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.3, max_tokens=RESOLUTION_MAX_TOKENS)
     logger.info(f"--- Exiting get_ticket_resolution for ticket_title: '{ticket_title}' ---")
     return resolution_response
 
 
-def generate_insights(df=None):
-    if client is None:
-        logger.error("OpenAI client not available for generate_insights")
-        return "Error: AI Insights generation not available."
+_SUMMARY_AND_RESOLUTION_SYSTEM_MESSAGE = "You are an expert IT support specialist who summarizes tickets and provides resolution steps."
+_SUMMARY_AND_RESOLUTION_PROMPT_TEMPLATE = """
+    Analyze the following IT support ticket. The ticket is in the '{category}' category.
 
-    logger.info("--- Entering generate_insights ---")
-    if df is None or df.empty:
-        logger.info("generate_insights: DataFrame not provided or empty, fetching from DB.")
-        df = get_tickets_df()
+    Ticket Title: {title}
+    Full Description (first 1500 characters):
+    ---
+    {description}
+    ---
 
-    if df is None or df.empty:
-        logger.warning("generate_insights: No ticket data available for analysis after attempting fetch.")
-        return "No ticket data available to generate insights."
+    Respond with a JSON object with exactly two string keys, using Markdown inside the strings:
+    "summary": exactly 3 concise bullet points ("- ...") on the core issue, context and impact.
+    "resolution": clear, actionable steps under the headings **1. Immediate Actions / Triage:**,
+    **2. Investigation / Root Cause Analysis:**, **3. Long-term Solution / Fix:** and
+    **4. Prevention (If Applicable):**, each followed by "- " steps. If a section is not applicable, state "Not Applicable".
+    """
 
-    sample_size = min(len(df), 50)
-    df_subset = df.sample(n=sample_size, random_state=1) if len(df) > sample_size else df.copy()
-    logger.info(f"generate_insights: Analyzing DataFrame subset with {len(df_subset)} rows (sampled if original > 50).")
 
-    cols_for_ai = ['title', 'category', 'created_at', 'status']
-    if 'resolution_time_hours' in df_subset.columns and df_subset['resolution_time_hours'].notna().any():
-        cols_for_ai.append('resolution_time_hours')
+def get_ticket_summary_and_resolution(ticket_title, ticket=None):
+    """
+    Summary and resolution for one ticket from a single JSON-mode request, so
+    the ticket context is sent (and prefilled) once instead of twice.
+    Returns (summary, resolution); both are the same error/not-found string on failure.
+    Output is generated sequentially, so this trades latency for fewer input
+    tokens and requests compared with get_ticket_summaries_and_resolutions.
+    """
+    if ticket is None:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+    if not ticket:
+        logger.warning(f"get_ticket_summary_and_resolution: Ticket '{ticket_title}' not found.")
+        not_found = f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+        return not_found, not_found
 
-    existing_cols_in_subset = [col for col in cols_for_ai if col in df_subset.columns]
-    if not existing_cols_in_subset:
-        logger.warning("generate_insights: No relevant columns found in the subset for AI analysis.")
-        return "Not enough data in the selected columns to generate insights."
-        
-    df_subset_str = df_subset[existing_cols_in_subset].astype(str).to_string(index=False, max_rows=15, max_cols=len(existing_cols_in_subset))
+    prompt_messages = [
+        {"role": "system", "content": _SUMMARY_AND_RESOLUTION_SYSTEM_MESSAGE},
+        {"role": "user", "content": _SUMMARY_AND_RESOLUTION_PROMPT_TEMPLATE.format(
+            category=ticket.get('category', 'N/A'), title=ticket.get('title', 'N/A'),
+            description=ticket.get('description', 'No description available.')[:1500]
+        )}
+    ]
+    raw_response = call_openai_api(
+        prompt_messages, model="gpt-3.5-turbo", temperature=0.3,
+        max_tokens=SUMMARY_MAX_TOKENS + RESOLUTION_MAX_TOKENS + 20, # +20 for the JSON wrapper and escapes
+        response_format={"type": "json_object"}
+    )
+    if raw_response.startswith("Error:"):
+        return raw_response, raw_response
+    try:
+        parsed = json.loads(raw_response)
+        summary, resolution = parsed["summary"], parsed["resolution"]
+        if not isinstance(summary, str) or not isinstance(resolution, str):
+            raise TypeError("summary and resolution must be strings")
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        logger.error(f"Could not parse summary/resolution JSON for '{ticket_title}' ({e}). Raw response was: '{raw_response}'")
+        return "Error: Invalid JSON", "Error: Invalid JSON"
+    return summary.strip(), resolution.strip()
+
+
+def stream_ticket_summary(ticket_title, ticket=None):
+    """Like get_ticket_summary, but yields the summary text as it is generated."""
+    if ticket is None:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+    if not ticket:
+        logger.warning(f"stream_ticket_summary: Ticket '{ticket_title}' not found.")
+        yield f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+        return
+    yield from call_openai_api_stream(
+        _build_summary_messages(ticket), model="gpt-3.5-turbo", temperature=0.2, max_tokens=SUMMARY_MAX_TOKENS
+    )
+
+
+def stream_ticket_resolution(ticket_title, ticket=None):
+    """Like get_ticket_resolution, but yields the resolution text as it is generated."""
+    if ticket is None:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+    if not ticket:
+        logger.warning(f"stream_ticket_resolution: Ticket '{ticket_title}' not found.")
+        yield f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+        return
+    yield from call_openai_api_stream(
+        _build_resolution_messages(ticket), model="gpt-3.5-turbo", temperature=0.3, max_tokens=RESOLUTION_MAX_TOKENS
+    )
+
+
+# --- Async / Concurrent Variants (for callers handling many tickets at once) ---
+def _fetch_tickets_by_titles(ticket_titles):
+    """Looks up all titles in one batched query. Returns {title: ticket or None} for every title."""
+    tickets = get_tickets_from_db_by_titles(ticket_titles)
+    return {title: tickets.get(title) for title in ticket_titles}
+
+
+async def _summarize_ticket_async(ticket_title, ticket, semaphore):
+    """Summary request for an already fetched ticket row (None if the title was not found)."""
+    if not ticket:
+        logger.warning(f"get_ticket_summary_async: Ticket '{ticket_title}' not found.")
+        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+    return await call_openai_api_async(
+        _build_summary_messages(ticket), model="gpt-3.5-turbo", temperature=0.2, max_tokens=SUMMARY_MAX_TOKENS, semaphore=semaphore
+    )
+
+
+async def _resolve_ticket_async(ticket_title, ticket, semaphore):
+    """Resolution request for an already fetched ticket row (None if the title was not found)."""
+    if not ticket:
+        logger.warning(f"get_ticket_resolution_async: Ticket '{ticket_title}' not found.")
+        return f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+    return await call_openai_api_async(
+        _build_resolution_messages(ticket), model="gpt-3.5-turbo", temperature=0.3, max_tokens=RESOLUTION_MAX_TOKENS, semaphore=semaphore
+    )
+
+
+async def get_ticket_summary_async(ticket_title, semaphore=None):
+    """Async get_ticket_summary; the DB lookup runs in a worker thread."""
+    ticket = await asyncio.to_thread(get_ticket_from_db_by_title, ticket_title)
+    return await _summarize_ticket_async(ticket_title, ticket, semaphore)
+
+
+async def get_ticket_resolution_async(ticket_title, semaphore=None):
+    """Async get_ticket_resolution; the DB lookup runs in a worker thread."""
+    ticket = await asyncio.to_thread(get_ticket_from_db_by_title, ticket_title)
+    return await _resolve_ticket_async(ticket_title, ticket, semaphore)
+
+
+async def batch_summaries(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """Summarizes many tickets concurrently. Results are in the same order as ticket_titles."""
+    tickets = await asyncio.to_thread(_fetch_tickets_by_titles, ticket_titles)
+    # Created per call: an asyncio.Semaphore is bound to the event loop it is first used on
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(_summarize_ticket_async(t, tickets[t], semaphore) for t in ticket_titles))
+
+
+async def batch_resolutions(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """Generates resolutions for many tickets concurrently. Results follow ticket_titles order."""
+    tickets = await asyncio.to_thread(_fetch_tickets_by_titles, ticket_titles)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(_resolve_ticket_async(t, tickets[t], semaphore) for t in ticket_titles))
+
+
+async def batch_summaries_and_resolutions(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """
+    Summary and resolution for many tickets in one fan-out: each ticket is
+    fetched once and all 2N requests share one concurrency cap.
+    Returns [(summary, resolution), ...] in ticket_titles order.
+    """
+    tickets = await asyncio.to_thread(_fetch_tickets_by_titles, ticket_titles)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    summaries, resolutions = await asyncio.gather(
+        asyncio.gather(*(_summarize_ticket_async(t, tickets[t], semaphore) for t in ticket_titles)),
+        asyncio.gather(*(_resolve_ticket_async(t, tickets[t], semaphore) for t in ticket_titles)),
+    )
+    return list(zip(summaries, resolutions))
 
-    system_message_insights = "You are an AI data analyst specializing in IT support ticket trends."
-    user_message_insights = f"""
-    Analyze the following sample of IT support ticket data. The full dataset has {len(df)} tickets.
-    The sample below contains {len(df_subset)} tickets and includes columns: {', '.join(existing_cols_in_subset)}.
+
+def get_ticket_summaries(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """Sync entry point for batch_summaries, for callers without a running event loop."""
+    return asyncio.run(_with_async_client(batch_summaries(ticket_titles, max_concurrency)))
+
+
+def get_ticket_resolutions(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """Sync entry point for batch_resolutions, for callers without a running event loop."""
+    return asyncio.run(_with_async_client(batch_resolutions(ticket_titles, max_concurrency)))
+
+
+def get_ticket_summaries_and_resolutions(ticket_titles, max_concurrency=OPENAI_MAX_CONCURRENCY):
+    """Sync entry point for batch_summaries_and_resolutions, for callers without a running event loop."""
+    return asyncio.run(_with_async_client(batch_summaries_and_resolutions(ticket_titles, max_concurrency)))
+
+
+INSIGHTS_SAMPLE_SIZE = 200 # Rows sent to the model; larger frames are randomly sampled down
+INSIGHTS_MAX_TOKENS = 400  # 3 insights, each a heading plus one-line explanation and recommendation
+
+# Insights keyed by (data fingerprint, prompt hash); identical data never pays for a second LLM call
+_insights_cache = LRUCache(maxsize=32)
+_insights_cache_lock = threading.Lock() # LRUCache.get reorders on every hit; dashboard sessions share it
+
+
+_INSIGHTS_SYSTEM_MESSAGE = "You are an AI data analyst specializing in IT support ticket trends."
+_INSIGHTS_PROMPT_TEMPLATE = """
+    Analyze the following sample of IT support ticket data. The full dataset has {total_tickets} tickets.
+    Ticket counts by category across the full dataset (JSON): {category_counts_json}
+    The sample below is CSV with a header row; it contains {sample_rows} tickets and includes columns: {columns}.
     ---
-    {df_subset_str}
+    {sample_csv}
     ---
 
     Based on this sample and your knowledge of IT support, provide 3 key actionable insights for an IT manager.
@@ -388,11 +1322,98 @@ def generate_insights(df=None):
        *Explanation:* ...
        *Recommendation:* ...
     """
+
+
+def _insights_fingerprint(df):
+    """Cheap data-change signal for the insights cache: row count and newest created_at."""
+    latest = df['created_at'].max() if 'created_at' in df.columns else None
+    return len(df), str(latest)
+
+
+def generate_insights(df=None):
+    """
+    Asks the model for 3 actionable insights over a sample of the tickets.
+    Responses are cached by data fingerprint and a hash of the exact prompt
+    (for DB reads, by table fingerprint and category counts), so reruns over
+    unchanged data skip the API; errors are not cached.
+    Call generate_insights.cache_clear() to force a fresh call.
+    """
+    if client is None:
+        logger.error("OpenAI client not available for generate_insights")
+        return "Error: AI Insights generation not available."
+
+    logger.info("--- Entering generate_insights ---")
+    db_cache_key = None
+    if df is None or df.empty:
+        # Only the prompt's sample rows leave the DB; counts are aggregated there.
+        # The SQL sample differs per call, so the cache is keyed on a table
+        # fingerprint and the counts, checked before any rows are fetched.
+        logger.info("generate_insights: DataFrame not provided or empty, sampling insights frame and counts from DB.")
+        from backend.db import db_conn, get_tickets_fingerprint
+        with db_conn(): # The three reads below share one pooled connection
+            category_counts = get_category_counts()
+            fingerprint = get_tickets_fingerprint()
+            if fingerprint is not None:
+                db_cache_key = ("db", fingerprint, tuple(sorted((str(c), int(n)) for c, n in category_counts.items())))
+                with _insights_cache_lock:
+                    cached_insights = _insights_cache.get(db_cache_key)
+                if cached_insights is not None:
+                    logger.info("generate_insights: Serving insights from cache; ticket data is unchanged.")
+                    return cached_insights
+            df = get_insights_frame(INSIGHTS_SAMPLE_SIZE, random_sample=True)
+    else:
+        category_counts = df['category'].value_counts().to_dict() if 'category' in df.columns else {}
+        # A categorical column also reports categories absent from this frame, with a zero count
+        category_counts = {category: count for category, count in category_counts.items() if count}
+
+    if df is None or df.empty:
+        logger.warning("generate_insights: No ticket data available for analysis after attempting fetch.")
+        return "No ticket data available to generate insights."
+
+    total_tickets = sum(category_counts.values()) if category_counts else len(df)
+    category_counts_json = json.dumps({str(category): int(count) for category, count in category_counts.items()})
+
+    df_subset = df.sample(n=INSIGHTS_SAMPLE_SIZE, random_state=1) if len(df) > INSIGHTS_SAMPLE_SIZE else df
+    logger.info(f"generate_insights: Analyzing DataFrame subset with {len(df_subset)} rows (sampled if original > {INSIGHTS_SAMPLE_SIZE}).")
+
+    cols_for_ai = ['title', 'category', 'created_at', 'status']
+    if 'resolution_time_hours' in df_subset.columns and df_subset['resolution_time_hours'].notna().any():
+        cols_for_ai.append('resolution_time_hours')
+
+    existing_cols_in_subset = [col for col in cols_for_ai if col in df_subset.columns]
+    if not existing_cols_in_subset:
+        logger.warning("generate_insights: No relevant columns found in the subset for AI analysis.")
+        return "Not enough data in the selected columns to generate insights."
+        
+    # CSV is far cheaper to produce than to_string's fixed-width layout and has no padding to spend tokens on.
+    # Dates are formatted in to_csv's vectorized writer; seconds add tokens without helping trend analysis
+    df_subset_str = df_subset[existing_cols_in_subset].to_csv(index=False, float_format="%.1f", date_format="%Y-%m-%d %H:%M")
+
+    user_message_insights = _INSIGHTS_PROMPT_TEMPLATE.format(
+        total_tickets=total_tickets, category_counts_json=category_counts_json,
+        sample_rows=len(df_subset), columns=', '.join(existing_cols_in_subset), sample_csv=df_subset_str
+    )
     prompt_messages = [
-        {"role": "system", "content": system_message_insights},
+        {"role": "system", "content": _INSIGHTS_SYSTEM_MESSAGE},
         {"role": "user", "content": user_message_insights}
     ]
 
-    insights_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.5, max_tokens=600)
+    cache_key = db_cache_key or (_insights_fingerprint(df), hashlib.sha256(user_message_insights.encode("utf-8")).hexdigest())
+    with _insights_cache_lock:
+        cached_insights = _insights_cache.get(cache_key)
+    if cached_insights is not None:
+        logger.info("generate_insights: Serving insights from cache; ticket data is unchanged.")
+        return cached_insights
+
+    insights_response = call_openai_api(prompt_messages, model="gpt-3.5-turbo", temperature=0.5, max_tokens=INSIGHTS_MAX_TOKENS)
+    if insights_response and not insights_response.startswith("Error:"):
+        with _insights_cache_lock:
+            _insights_cache[cache_key] = insights_response
     logger.info(f"--- Exiting generate_insights ---")
-    return insights_response
\ No newline at end of file
+    return insights_response
+
+def _clear_insights_cache():
+    with _insights_cache_lock:
+        _insights_cache.clear()
+
+generate_insights.cache_clear = _clear_insights_cache
\ No newline at end of file
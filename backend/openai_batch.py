@@ -0,0 +1,72 @@
+# File path: backend/openai_batch.py
+import io
+import json
+import time
+import logging
+
+# Get a logger instance for this module
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchError(Exception):
+    """Raised when a batch cannot be submitted, fails, or does not finish in time."""
+
+
+def submit_batch(client, request_bodies):
+    """
+    Uploads one chat-completion request per (custom_id, body) pair as a JSONL
+    file and creates a 24h batch for it. Returns the batch id.
+    Batch requests are billed at a discount and have their own rate limits.
+    """
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        for custom_id, body in request_bodies
+    ]
+    batch_input = io.BytesIO("\n".join(lines).encode("utf-8"))
+    batch_input.name = "batch_input.jsonl"
+    input_file = client.files.create(file=batch_input, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(lines)} requests.")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_interval_seconds=30, timeout_seconds=24 * 3600):
+    """
+    Polls a batch until it reaches a terminal status and returns
+    {custom_id: response content} for the requests that succeeded.
+    Raises BatchError if the batch does not complete within timeout_seconds.
+    """
+    deadline = time.monotonic() + timeout_seconds
+    batch = client.batches.retrieve(batch_id)
+    while batch.status not in BATCH_TERMINAL_STATUSES:
+        if time.monotonic() > deadline:
+            raise BatchError(f"Batch {batch_id} did not finish within {timeout_seconds}s (status: {batch.status}).")
+        time.sleep(poll_interval_seconds)
+        batch = client.batches.retrieve(batch_id)
+        logger.info(f"Batch {batch_id} status: {batch.status}")
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise BatchError(f"Batch {batch_id} ended with status '{batch.status}'.")
+
+    results = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            logger.warning(f"Batch request {result['custom_id']} failed: {result.get('error') or response.get('status_code')}.")
+            continue
+        results[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+    logger.info(f"Collected {len(results)} successful results from batch {batch_id} (output file {batch.output_file_id}).")
+    if batch.error_file_id:
+        # Requests rejected before reaching the model are listed here, not in the output file
+        logger.warning(f"Batch {batch_id} has failed requests; see error file {batch.error_file_id}.")
+    return results
@@ -2,37 +2,100 @@
 # -----------------------------
 # data_processing/document_loader.py
 
-from docx import Document
-import fitz  # PyMuPDF
+import codecs
+import mmap
+import os
 
-def load_txt(file_path):
-    """Load text file with multiple encoding attempts"""
-    encodings = ['utf-8', 'latin-1', 'utf-16', 'ascii']
-    for encoding in encodings:
+# fitz (PyMuPDF) and python-docx are imported inside the loaders that use them:
+# both are heavy native/XML stacks that importers of this module may never need
+
+# UTF-8 needs at most 4 bytes per character, so this many bytes always covers max_chars
+MAX_BYTES_PER_CHAR = 4
+
+def _read_txt_bytes(file_path, max_chars):
+    """
+    Returns (raw_bytes, is_complete). Files larger than the max_chars byte window
+    are memory-mapped and only that window is copied out.
+    """
+    with open(file_path, 'rb') as f:
+        byte_limit = None if max_chars is None else max_chars * MAX_BYTES_PER_CHAR
+        if byte_limit is None or os.fstat(f.fileno()).st_size <= byte_limit:
+            return f.read(), True
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:byte_limit], False
+
+# Longest BOMs first: the UTF-32-LE BOM starts with the UTF-16-LE one
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+def _sniff_encodings(raw):
+    """
+    Encodings to try for raw bytes: the one named by a byte-order mark if
+    present, else UTF-8 with latin-1 (which decodes any byte) as the fallback.
+    """
+    for bom, encoding in _BOM_ENCODINGS:
+        if raw.startswith(bom):
+            return [encoding]
+    return ['utf-8', 'latin-1']
+
+def load_txt(file_path, max_chars=None):
+    """Load text file, sniffing the encoding from its BOM once, reading at most max_chars characters"""
+    raw, is_complete = _read_txt_bytes(file_path, max_chars)
+    for encoding in _sniff_encodings(raw):
         try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                content = f.read().strip()
-                if not content:
-                    raise ValueError("Empty file")
-                return content
+            # An incremental decoder tolerates a multi-byte character cut off at the window edge
+            content = codecs.getincrementaldecoder(encoding)().decode(raw, final=is_complete)
+            if max_chars is not None:
+                content = content[:max_chars]
+            content = content.strip()
+            if not content:
+                raise ValueError("Empty file")
+            return content
         except (UnicodeDecodeError, ValueError):
             continue
     raise ValueError(f"Failed to decode {file_path}")
 
-def load_pdf(file_path):
-    """Load PDF file text"""
+def iter_pdf_pages(file_path):
+    """Yields the text of each PDF page in order; only the current page is held in memory"""
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.get_text()
+
+def iter_docx_paragraphs(file_path):
+    """Yields the text of each DOCX paragraph in order"""
+    from docx import Document
+    for para in Document(file_path).paragraphs:
+        yield para.text
+
+def _take_chars(pieces, max_chars, separator_len=0):
+    """Collects pieces from a stream until max_chars characters have been seen"""
+    parts = []
+    total_chars = 0
+    for piece in pieces:
+        parts.append(piece)
+        total_chars += len(piece) + separator_len
+        if max_chars is not None and total_chars >= max_chars:
+            break
+    return parts
+
+def load_pdf(file_path, max_chars=None):
+    """Load PDF file text, stopping once max_chars characters have been extracted"""
     try:
-        doc = fitz.open(file_path)
-        return "".join([page.get_text() for page in doc])
+        return "".join(_take_chars(iter_pdf_pages(file_path), max_chars))
     except Exception as e:
         print(f"⚠️ PDF load error: {str(e)}")
         return ""
 
-def load_docx(file_path):
-    """Load DOCX file text"""
+def load_docx(file_path, max_chars=None):
+    """Load DOCX file text, stopping once max_chars characters have been extracted"""
     try:
-        doc = Document(file_path)
-        return "\n".join([para.text for para in doc.paragraphs])
+        return "\n".join(_take_chars(iter_docx_paragraphs(file_path), max_chars, separator_len=1))
     except Exception as e:
         print(f"⚠️ DOCX load error: {str(e)}")
         return ""
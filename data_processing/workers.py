@@ -0,0 +1,52 @@
+# File path: data_processing/workers.py
+# -----------------------------
+# data_processing/workers.py
+#
+# The code ingestion runs in its pool worker processes. Workers re-import the
+# module of their target, so nothing here may import backend.db: each worker
+# would otherwise build its own engine and open a test connection.
+
+import logging
+import multiprocessing
+from data_processing.document_loader import load_pdf, load_txt, load_docx
+
+# Get a logger instance for this module
+logger = logging.getLogger(__name__)
+
+# Start method for every process pool in the project (ingestion and sample
+# generation). Workers come from a clean forkserver (spawn where unavailable),
+# not a fork of the caller: callers such as run_ingestion are multi-threaded,
+# and forking a multi-threaded process can deadlock the child
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+MAX_CONTENT_LENGTH = 5000
+
+# Supported extensions mapped to their loader; the single source of truth for ingestion
+_LOADERS = {
+    '.pdf': load_pdf,
+    '.txt': load_txt,
+    '.docx': load_docx,
+}
+SUPPORTED_EXTENSIONS = frozenset(_LOADERS) # O(1) membership for the directory scan
+
+def process_file(filepath, max_chars=MAX_CONTENT_LENGTH):
+    """
+    Processes a single file based on its extension.
+    Extraction stops once max_chars characters have been read.
+    Returns the file content as a string or None if processing fails.
+    """
+    loader = _LOADERS.get(filepath.suffix.lower())
+    if loader is None:
+        logger.warning(f"Skipping unsupported file type: {filepath.name}")
+        return None
+    try:
+        return loader(filepath, max_chars=max_chars)
+    except Exception as e:
+        logger.error(f"--- ERROR PROCESSING FILE: {filepath.name} ---")
+        logger.error(f"Error type: {type(e).__name__}")
+        logger.error(f"Error message: {e}")
+        logger.error("Traceback for file processing error:", exc_info=True)
+        logger.error("---------------------------------------------")
+        return None
@@ -7,6 +7,15 @@ CREATE TABLE IF NOT EXISTS tickets (
     file_name TEXT,
     file_type VARCHAR(10),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_category (category),
+    content_sha256 CHAR(64) UNIQUE,
+    INDEX idx_category_id (category, id),
     INDEX idx_created (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- LLM category assignments keyed by sha256 of model, categories and normalized ticket text
+CREATE TABLE IF NOT EXISTS category_cache (
+    content_hash CHAR(64) PRIMARY KEY,
+    category VARCHAR(50) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -8,6 +8,10 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 
 # --- Determine Project Root and Add to Python Path ---
 try:
@@ -26,7 +30,10 @@ if str(PROJECT_ROOT) not in sys.path:
     logging.info(f"Added project root to sys.path: {PROJECT_ROOT}")
 
 # Now import the backend functions
-from backend.openai_agent import get_ticket_summary, get_ticket_resolution
+from backend.openai_agent import (
+    get_ticket_from_db_by_title, get_ticket_resolution, get_ticket_summary_and_resolution,
+    stream_ticket_summary, stream_ticket_resolution
+)
 
 # --- Basic Logging Setup ---
 # Consistent logging format
@@ -34,23 +41,27 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - CH
 logger = logging.getLogger("ChatAssistant") # Use a named logger
 
 # --- Load Environment Variables ---
-# Load .env file from the project root
-try:
-    current_file_path = Path(__file__).resolve()
-    project_root = current_file_path.parent.parent.parent # Assumes pages -> frontend -> root
-    dotenv_path = project_root / '.env'
-    if dotenv_path.exists():
-        load_dotenv(dotenv_path=dotenv_path)
-        logger.info(f"Loaded .env file from: {dotenv_path}")
-    else:
-        logger.warning(f".env file not found at calculated path: {dotenv_path}. Relying on default load_dotenv().")
-        load_dotenv() # Try default search path
-except Exception as e:
-    logger.error(f"Error loading .env file: {e}. Trying default load_dotenv().")
-    load_dotenv()
-
-API_KEY_LOADED = os.getenv("OPENAI_API_KEY") is not None
-logger.info(f"OpenAI API Key Loaded: {API_KEY_LOADED}")
+# Streamlit re-executes this script on every interaction; the .env lookup and
+# parse only need to happen once per process, so the result is cached.
+@st.cache_resource(show_spinner=False)
+def _load_environment():
+    """Loads the project-root .env file once. Returns whether OPENAI_API_KEY is set."""
+    try:
+        dotenv_path = PROJECT_ROOT / '.env'
+        if dotenv_path.exists():
+            load_dotenv(dotenv_path=dotenv_path)
+            logger.info(f"Loaded .env file from: {dotenv_path}")
+        else:
+            logger.warning(f".env file not found at calculated path: {dotenv_path}. Relying on default load_dotenv().")
+            load_dotenv() # Try default search path
+    except Exception as e:
+        logger.error(f"Error loading .env file: {e}. Trying default load_dotenv().")
+        load_dotenv()
+    api_key_loaded = os.getenv("OPENAI_API_KEY") is not None
+    logger.info(f"OpenAI API Key Loaded: {api_key_loaded}")
+    return api_key_loaded
+
+API_KEY_LOADED = _load_environment()
 if not API_KEY_LOADED:
     st.error("⚠️ **Configuration Error:** OpenAI API Key not found. Please ensure it is set in your `.env` file.")
     logger.critical("OpenAI API Key not found in environment variables.")
@@ -62,6 +73,172 @@ st.set_page_config(page_title="Chat Assistant", layout="wide") # Set page config
 st.title("🎟️ Chat Assistant")
 st.markdown("Ask me to summarize or suggest resolutions for tickets (e.g., `summarize ticket #5`, `solve ticket #12`, or `summarize and solve ticket #5`).")
 
+# --- Prompt Parsing ---
+# Case-insensitive, so the prompt is never lowercased. Both action keyword sets
+# share one alternation, so a single scan finds every requested action
+# "ticket #5", "ticket 5", "ticket no. 5" and "ticket number 5" all name the same ticket
+_TICKET_RE = re.compile(r"ticket\s*(?:#|no\.?|number)?\s*(\d+)", re.IGNORECASE)
+_ACTION_RE = re.compile(
+    r"(?P<summary>summar(?:y|ize))|(?P<resolution>solve|resolution|fix|solution|suggest)", re.IGNORECASE
+)
+
+# One JSON request for "summarize and solve" instead of two overlapping ones:
+# fewer input tokens and requests, but nothing is shown until both are generated
+CHAT_COMBINED_REQUEST = os.getenv("CHAT_COMBINED_REQUEST", "").lower() in ("1", "true", "yes")
+
+# --- Answer Cache ---
+# Shared by every session in the process: a repeat question about the same ticket,
+# from any user, skips the DB lookup and the OpenAI round-trip entirely. Entries are
+# keyed by (action, ticket title), not by prompt text, so any phrasing that names
+# the same action and ticket number is a hit. A ticket edited after its answer was
+# cached keeps the old answer for up to ANSWER_CACHE_TTL_SECONDS, or until
+# "Clear cached answers" is pressed.
+ANSWER_CACHE_TTL_SECONDS = 1800
+
+@st.cache_resource
+def _answer_cache():
+    """
+    Process-wide ({(kind, ticket_title): text}, lock) shared by every session.
+    A plain TTL store rather than st.cache_data, so a miss can be streamed and
+    only successful answers are stored.
+    """
+    return TTLCache(maxsize=512, ttl=ANSWER_CACHE_TTL_SECONDS), threading.Lock()
+
+@st.cache_resource
+def _answer_executor():
+    """Worker threads for answers generated alongside a stream; shared across reruns and sessions."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-answer")
+
+# The backend's error and not-found strings always start with one of these
+_ERROR_PREFIXES = ("Error:", "Sorry, I could not find")
+
+def _is_error_response(text):
+    """
+    True for the backend's error and not-found strings (and missing responses).
+    A prefix check: O(1) on long answers, and a resolution that merely quotes
+    an "Error:" message is not mistaken for a failure.
+    """
+    return not isinstance(text, str) or text.startswith(_ERROR_PREFIXES)
+
+if st.sidebar.button("Clear cached answers"):
+    answer_cache, answer_cache_lock = _answer_cache()
+    with answer_cache_lock:
+        answer_cache.clear()
+    logger.info("Cleared cached ticket summaries and resolutions.")
+
+_ANSWER_STREAMS = {"summary": stream_ticket_summary, "resolution": stream_ticket_resolution}
+
+# Minimum time between placeholder updates while streaming; deltas arrive far
+# more often than a browser needs to repaint
+STREAM_RENDER_INTERVAL_SECONDS = 0.05
+
+def _render_stream(placeholder, stream):
+    """
+    Shows stream deltas in placeholder as plain text, at most once per
+    STREAM_RENDER_INTERVAL_SECONDS, and returns the full text. Markdown is
+    rendered once by the caller when the stream completes.
+    """
+    parts = []
+    last_render = 0.0
+    for delta in stream:
+        parts.append(delta)
+        now = time.monotonic()
+        if now - last_render >= STREAM_RENDER_INTERVAL_SECONDS:
+            placeholder.text("".join(parts))
+            last_render = now
+    return "".join(parts)
+
+def _show_answer(kind, ticket_num_str, ticket_title, text=None, stream=None, pending=None, fresh=False):
+    """
+    Renders one answer in the current chat bubble, from text, by streaming it
+    or from a pending future of the answer executor, and returns it formatted for the history. Errors, including a stream that
+    fails partway or yields nothing, replace the streamed text and are not cached.
+    Only newly generated answers (streamed, pending, or text with fresh=True)
+    are cached: storing a cache hit again would restart its TTL.
+    """
+    placeholder = st.empty()
+    try:
+        if stream is not None:
+            text = _render_stream(placeholder, stream)
+        elif pending is not None:
+            text = pending.result()
+    except Exception as e:
+        logger.error(f"Generating {kind} for {ticket_title} failed: {e}", exc_info=True)
+        text = f"Error: {e}"
+    if not _is_error_response(text) and not text.strip():
+        text = "Error: The model returned an empty response."
+    if _is_error_response(text):
+        logger.error(f"Error getting {kind} for {ticket_title}: {text}")
+        text = f"_(Error retrieving {kind} for ticket #{ticket_num_str}. Reason: {text})_"
+        placeholder.markdown(text)
+        return text, False
+    placeholder.markdown(text)
+    if fresh or stream is not None or pending is not None:
+        answer_cache, answer_cache_lock = _answer_cache()
+        with answer_cache_lock:
+            answer_cache[(kind, ticket_title)] = text
+    return text, True
+
+def _answer_ticket_request(ticket_num_str, ticket_title, kinds):
+    """
+    Renders the requested answers ("summary" and/or "resolution", in order) into
+    the current chat bubble and returns the combined markdown for the history.
+    Cached answers appear at once and the rest stream as they are generated;
+    when both are missing, the resolution is generated in a worker thread
+    while the summary streams, so the two OpenAI calls overlap.
+    """
+    answer_cache, answer_cache_lock = _answer_cache()
+    with answer_cache_lock:
+        answers = {kind: answer_cache.get((kind, ticket_title)) for kind in kinds}
+    missing = [kind for kind in kinds if answers[kind] is None]
+
+    ticket = None
+    if missing:
+        ticket = get_ticket_from_db_by_title(ticket_title)
+        if not ticket:
+            logger.warning(f"Ticket '{ticket_title}' not found.")
+            for kind in missing:
+                answers[kind] = f"Sorry, I could not find a ticket with the title '{ticket_title}'."
+            missing = []
+
+    response_parts = []
+    summary_ok = False
+    pending_resolution = None
+    generated = set() # Kinds whose text was just generated rather than read from the cache
+    if len(missing) == 2 and CHAT_COMBINED_REQUEST:
+        with st.spinner("Thinking..."):
+            answers["summary"], answers["resolution"] = get_ticket_summary_and_resolution(ticket_title, ticket)
+        generated.update(missing)
+        missing = []
+    elif len(missing) == 2:
+        pending_resolution = _answer_executor().submit(get_ticket_resolution, ticket_title, ticket)
+
+    for kind in kinds:
+        if kind == "summary":
+            heading = f"**Summary for Ticket #{ticket_num_str}:**"
+        else:
+            # Only say "Also" when a summary was shown successfully above
+            heading = f"**{'Also, Suggested' if summary_ok else 'Suggested'} Solution for Ticket #{ticket_num_str}:**"
+        st.markdown(heading)
+
+        if kind == "resolution" and pending_resolution is not None:
+            with st.spinner("Finishing the suggested solution..."):
+                text, ok = _show_answer(kind, ticket_num_str, ticket_title, pending=pending_resolution)
+        elif kind in missing:
+            text, ok = _show_answer(kind, ticket_num_str, ticket_title,
+                                    stream=_ANSWER_STREAMS[kind](ticket_title, ticket=ticket))
+        else:
+            text, ok = _show_answer(kind, ticket_num_str, ticket_title, text=answers[kind], fresh=kind in generated)
+        if kind == "summary":
+            summary_ok = ok
+        # Pieces are collected as-is and joined once, so answer text is copied a single time
+        response_parts += (heading, "\n", text)
+        if kind != kinds[-1]:
+            st.markdown("---")
+            response_parts.append("\n\n---\n\n")
+
+    return "".join(response_parts)
+
 # --- Initialize Chat History ---
 if "messages" not in st.session_state:
     logger.info("Initializing chat history in session state.")
@@ -70,135 +247,90 @@ if "messages" not in st.session_state:
     ]
 
 # --- Display Existing Chat Messages ---
-logger.debug("Displaying existing chat messages from session state.")
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# --- Handle User Input ---
-if prompt := st.chat_input("Ask about a ticket..."):
-    logger.info(f"Received user prompt: '{prompt}'")
-    # Add user message to chat history immediately
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    # Display user message
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    # --- Process the User's Request (Handles Multiple Actions) ---
-    response = "" # Initialize response string
-    prompt_lower = prompt.lower()
-
-    with st.spinner("Thinking..."):
-        # Regex to find "ticket #<number>" pattern more robustly
-        match = re.search(r"ticket\s*#(\d+)", prompt_lower)
-
-        if match:
-            ticket_num_str = match.group(1) # Extract the number captured by (\d+)
-            # Construct the expected title format used during ingestion
-            target_ticket_title = f"ticket_{ticket_num_str}"
-            logger.info(f"Found 'ticket #{ticket_num_str}'. Constructed title: '{target_ticket_title}'")
-
-            try:
-                # --- Detect Requested Actions ---
-                # Check for keywords indicating summary request
-                request_summary = "summary" in prompt_lower or "summarize" in prompt_lower
-                # Check for keywords indicating resolution request (EXPANDED KEYWORDS)
-                request_resolution = ("solve" in prompt_lower or
-                                      "resolution" in prompt_lower or
-                                      "fix" in prompt_lower or
-                                      "solution" in prompt_lower or # Added "solution"
-                                      "suggest" in prompt_lower)    # Added "suggest"
-
-                summary_response = ""
-                resolution_response = ""
-                action_performed = False # Flag to track if any action was taken
-
-                # --- Call Functions Based on Detected Actions ---
-                if request_summary:
-                    logger.info(f"Action detected: summary for ticket title '{target_ticket_title}'")
-                    summary_text = get_ticket_summary(target_ticket_title)
-                    action_performed = True
-                    # Check if the backend returned an error or valid summary
-                    if summary_text is None or "Error:" in str(summary_text) or "Sorry, I could not find" in str(summary_text):
-                         logger.error(f"Error getting summary for {target_ticket_title}: {summary_text}")
-                         summary_response = f"_(Error retrieving summary for ticket #{ticket_num_str}. Reason: {summary_text})_"
-                    else:
-                         summary_response = summary_text # Store valid summary
-
-                if request_resolution:
-                    logger.info(f"Action detected: resolution for ticket title '{target_ticket_title}'")
-                    resolution_text = get_ticket_resolution(target_ticket_title)
-                    action_performed = True
-                    # Check if the backend returned an error or valid resolution
-                    if resolution_text is None or "Error:" in str(resolution_text) or "Sorry, I could not find" in str(resolution_text):
-                        logger.error(f"Error getting resolution for {target_ticket_title}: {resolution_text}")
-                        resolution_response = f"_(Error retrieving resolution for ticket #{ticket_num_str}. Reason: {resolution_text})_"
+# Every rerun re-sends each rendered message to the browser, so long
+# conversations show only the most recent ones unless asked for the rest.
+# (Markdown is parsed client-side; pre-rendering HTML here would add work, not save it.)
+# Older messages stay in session state and are loaded a page at a time on request.
+CHAT_HISTORY_RENDER_LIMIT = 50
+
+# --- Chat Turn ---
+# A fragment: submitting a prompt (or loading earlier messages) reruns only this
+# function, not the env loading, page header and sidebar above it.
+@st.fragment
+def _chat_turn():
+    """Renders the visible chat history, then answers a newly submitted prompt."""
+    logger.debug("Displaying existing chat messages from session state.")
+    if "history_render_limit" not in st.session_state:
+        st.session_state.history_render_limit = CHAT_HISTORY_RENDER_LIMIT
+    hidden_count = len(st.session_state.messages) - st.session_state.history_render_limit
+    if hidden_count > 0 and st.button(f"Load earlier messages ({hidden_count} hidden)"):
+        st.session_state.history_render_limit += CHAT_HISTORY_RENDER_LIMIT
+    visible_messages = st.session_state.messages[-st.session_state.history_render_limit:]
+    for message in visible_messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # --- Handle User Input ---
+    if prompt := st.chat_input("Ask about a ticket..."):
+        logger.info(f"Received user prompt: '{prompt}'")
+        # Add user message to chat history immediately
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Display user message
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # --- Process the User's Request (Handles Multiple Actions) ---
+        response = "" # Initialize response string
+
+        # The answer is rendered (and streamed) straight into the assistant bubble.
+        # No DB connection is held for the turn: it makes at most one title lookup,
+        # which checks a connection out only for that query, not for the LLM calls
+        with st.chat_message("assistant"):
+            # Regex to find "ticket #<number>" pattern more robustly
+            match = _TICKET_RE.search(prompt)
+
+            if match:
+                ticket_num_str = match.group(1) # Extract the number captured by (\d+)
+                # Construct the expected title format used during ingestion
+                target_ticket_title = f"ticket_{ticket_num_str}"
+                logger.info(f"Found 'ticket #{ticket_num_str}'. Constructed title: '{target_ticket_title}'")
+
+                try:
+                    # --- Detect Requested Actions ---
+                    # Summary keywords ("summary", "summarize") and resolution keywords
+                    # ("solve", "resolution", "fix", "solution", "suggest") in one pass
+                    detected_actions = {action.lastgroup for action in _ACTION_RE.finditer(prompt)}
+                    requested_kinds = [kind for kind in ("summary", "resolution") if kind in detected_actions]
+                    if requested_kinds:
+                        logger.info(f"Actions detected: {', '.join(requested_kinds)} for ticket title '{target_ticket_title}'")
+                        response = _answer_ticket_request(ticket_num_str, target_ticket_title, requested_kinds)
                     else:
-                        resolution_response = resolution_text # Store valid resolution
-
-
-                # --- Combine Responses Based on What Was Requested and Successful ---
-                response_parts = []
-                if request_summary and summary_response: # Add summary if requested and available (or if error message generated)
-                    response_parts.append(f"**Summary for Ticket #{ticket_num_str}:**\n{summary_response}")
-
-                if request_resolution and resolution_response: # Add resolution if requested and available
-                    # Only add heading if summary wasn't also requested OR if summary failed
-                    heading = "**Suggested Solution"
-                    if request_summary and summary_response and "Error" not in summary_response :
-                         heading = "**Also, Suggested Solution" # Change heading if summary is also present
-
-                    response_parts.append(f"{heading} for Ticket #{ticket_num_str}:**\n{resolution_response}")
-
-                if response_parts:
-                    # Combine the parts with a separator if both exist
-                    response = "\n\n---\n\n".join(response_parts)
-                elif action_performed:
-                    # An action was requested but resulted in errors for both summary and resolution
-                    response = f"Sorry, I encountered errors trying to get the requested information for ticket #{ticket_num_str}. Please check the logs."
-                else:
-                    # Ticket number found, but no action keywords (summary/solve etc.)
-                    logger.info(f"Ticket title '{target_ticket_title}' identified, but no clear action keyword found.")
-                    response = f"Okay, I can look up information for ticket '{target_ticket_title}' (Ticket #{ticket_num_str}). What specific action would you like? (e.g., 'summarize' or 'solve')"
-
-            except Exception as e:
-                # Catch potential errors during processing this specific ticket request
-                logger.error(f"Error processing prompt for title '{target_ticket_title}': {e}", exc_info=True)
-                response = f"Sorry, I encountered an error trying to process your request for ticket #{ticket_num_str}. Please check the system logs or try again later."
+                        # Ticket number found, but no action keywords (summary/solve etc.)
+                        logger.info(f"Ticket title '{target_ticket_title}' identified, but no clear action keyword found.")
+                        response = f"Okay, I can look up information for ticket '{target_ticket_title}' (Ticket #{ticket_num_str}). What specific action would you like? (e.g., 'summarize' or 'solve')"
+                        st.markdown(response)
+
+                except Exception as e:
+                    # Catch potential errors during processing this specific ticket request
+                    logger.error(f"Error processing prompt for title '{target_ticket_title}': {e}", exc_info=True)
+                    response = f"Sorry, I encountered an error trying to process your request for ticket #{ticket_num_str}. Please check the system logs or try again later."
+                    st.markdown(response)
 
+            else:
+                # "ticket #" pattern was NOT found in the prompt. Handle general queries or give guidance.
+                # This part could be expanded later to handle more general QA if needed.
+                logger.info("Prompt does not match 'ticket #<number>' pattern. Providing default guidance.")
+                response = "I can help with specific tickets identified by their number (e.g., 'summarize ticket #5'). How can I assist?"
+                st.markdown(response)
+
+        # --- Add Assistant Response to History ---
+        # Already displayed above; the next fragment run renders it from history, so no st.rerun() is needed
+        if response and response.strip():
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            logger.info(f"Assistant response added to history (first 100 chars): '{response[:100]}...'")
         else:
-            # "ticket #" pattern was NOT found in the prompt. Handle general queries or give guidance.
-            # This part could be expanded later to handle more general QA if needed.
-            logger.info("Prompt does not match 'ticket #<number>' pattern. Providing default guidance.")
-            response = "I can help with specific tickets identified by their number (e.g., 'summarize ticket #5'). How can I assist?"
-
-
-        # --- Post-processing the final response string ---
-        if response is None:
-             logger.error("Generated response was None unexpectedly after processing!")
-             response = "Sorry, an internal error occurred, and I received an empty response."
-        elif not isinstance(response, str):
-             logger.error(f"Backend function returned non-string type: {type(response)}")
-             response = "Sorry, an unexpected response format was received from the backend."
-        elif not response.strip(): # Check if response is empty or just whitespace AFTER stripping
-             logger.warning(f"Generated response was empty or whitespace for prompt: '{prompt}'")
-             response = "Sorry, I couldn't generate a specific response for that request." # Avoid empty bubble
-
-
-    # --- Display Assistant Response ---
-    # Only display and add to history if there's a meaningful response string
-    if response and response.strip():
-        logger.info(f"Displaying generated response (first 100 chars): '{response[:100]}...'")
-        with st.chat_message("assistant"):
-            st.markdown(response)
-        # Add the valid assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
-        logger.info("Assistant response added to history and displayed.")
-    else:
-        # Log if response was empty or invalid after processing, but don't display/add
-        logger.error(f"Final response was empty or invalid after processing prompt '{prompt}'. No message displayed.")
-
-
-    # Use st.rerun() to update the chat display immediately after processing
-    # This helps make the interaction feel more responsive.
-    st.rerun()
+            # Log if response was empty or invalid after processing, but don't add it
+            logger.error(f"Final response was empty or invalid after processing prompt '{prompt}'. Nothing added to history.")
+
+
+_chat_turn()
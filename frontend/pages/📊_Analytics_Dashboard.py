@@ -1,13 +1,16 @@
 # File path: frontend/pages/📊_Analytics_Dashboard.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from datetime import datetime, date, timedelta
 import calendar
+import hashlib
 import io
 import logging
 import os
 import sys
+import time
 from pathlib import Path
 
 # --- Determine Project Root and Add to Python Path ---
@@ -27,7 +30,7 @@ if str(PROJECT_ROOT) not in sys.path:
     logging.info(f"Added project root to sys.path: {PROJECT_ROOT}")
 
 # Now import the backend functions
-from backend.db import get_tickets_df # Ensure this fetches necessary columns
+from backend.db import get_tickets_df, get_tickets_fingerprint # Ensure this fetches necessary columns
 from backend.openai_agent import generate_insights # Assuming this exists
 
 # --- Basic Logging Setup ---
@@ -39,15 +42,100 @@ st.title("📊 Ticket Analytics Dashboard")
 st.markdown("Explore trends, status, resolution times, and insights from ticket data.")
 
 # --- Helper Functions ---
-@st.cache_data # Cache the data loading
-def load_data():
-    """Loads ticket data and performs initial cleaning."""
-    logging.info("Attempting to load data from DB...")
+# Only the columns the dashboard shows or exports are read; descriptions are skipped
+DASHBOARD_COLUMNS = ['id', 'title', 'category', 'status', 'file_type', 'created_at', 'resolved_at']
+DASHBOARD_HISTORY_DAYS = 365 # Default load window; older tickets are read only on request
+
+# --- Parquet Snapshot of the Cleaned Data ---
+# st.cache_data is per process, so every restart re-read the DB and re-ran the
+# cleaning below. The cleaned frame is also written to a Parquet file named after
+# the tickets fingerprint (row count, newest created_at), which categorical and
+# datetime dtypes survive. The fingerprint cannot see in-place UPDATEs (e.g.
+# run_categorization writing categories back), so snapshots also expire by age.
+DASHBOARD_SNAPSHOT_DIR = Path(os.getenv("DASHBOARD_SNAPSHOT_DIR", PROJECT_ROOT / ".cache" / "dashboard"))
+DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS", "3600")) # 0 disables snapshots
+SNAPSHOT_FORMAT_VERSION = 4 # Bump when the cleaning below changes, so old snapshots are not reused
+
+def _snapshot_path(since, fingerprint):
+    """Snapshot file for one load window and tickets fingerprint."""
+    key = repr((SNAPSHOT_FORMAT_VERSION, since, DASHBOARD_COLUMNS, fingerprint))
+    return DASHBOARD_SNAPSHOT_DIR / f"tickets_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.parquet"
+
+def _read_snapshot(path):
+    """Returns (df, has_status, has_resolved_at) from a fresh snapshot, or None."""
     try:
-        df = get_tickets_df()
+        if time.time() - path.stat().st_mtime > DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS:
+            return None
+        df = pd.read_parquet(path, engine='pyarrow')
+        logging.info(f"Loaded {len(df)} rows from snapshot {path.name}.")
+        return df, df.attrs.get('has_status', False), df.attrs.get('has_resolved_at', False)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Could not read dashboard snapshot {path}: {e}")
+        return None
+
+def _write_snapshot(path, df, has_status, has_resolved_at):
+    """Writes df atomically (temp file + rename) and removes expired snapshots. Failures are logged only."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        snapshot = df.copy(deep=False)
+        snapshot.attrs = {'has_status': has_status, 'has_resolved_at': has_resolved_at}
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        snapshot.to_parquet(tmp_path, engine='pyarrow', compression='snappy')
+        os.replace(tmp_path, path)
+        for old_path in path.parent.glob("tickets_*.parquet"):
+            if old_path != path and time.time() - old_path.stat().st_mtime > DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS:
+                old_path.unlink(missing_ok=True)
+    except Exception as e:
+        logging.warning(f"Could not write dashboard snapshot {path}: {e}")
+
+# Fixed grays for the placeholder categories; the rest take palette colors in name order
+RESERVED_CATEGORY_COLORS = {'Pending': '#CCCCCC', 'Unknown': '#E0E0E0'}
+
+def _category_colors(df):
+    """
+    (category, color) pairs for every category in the loaded frame, sorted so they
+    are hashable chart cache keys. Assigned once per load rather than per filtered
+    view, so a category keeps its color whatever the filters show.
+    """
+    palette = px.colors.qualitative.Pastel
+    categories = sorted(c for c in df['category'].unique() if c not in RESERVED_CATEGORY_COLORS) if not df.empty else []
+    color_map = {cat: palette[i % len(palette)] for i, cat in enumerate(categories)}
+    color_map.update(RESERVED_CATEGORY_COLORS)
+    return tuple(sorted(color_map.items()))
+
+# st.cache_resource, not st.cache_data: cache_data pickles and unpickles the whole
+# frame on every rerun to hand out a private copy. The page never writes to the
+# loaded or filtered frames (the export copies its columns first), so they are
+# shared read-only across reruns and sessions.
+@st.cache_resource # One entry per `since`
+def load_data(since=None):
+    """
+    Loads ticket data created on or after `since` (all of it when None) and
+    performs initial cleaning, from a fresh Parquet snapshot when one matches
+    the current tickets fingerprint. Also returns the category colors and the
+    load time, which stays fixed while this result is cached and so identifies
+    the loaded data in the filter cache key. The returned frame is shared: do
+    not modify it.
+    """
+    loaded_at = time.time()
+    snapshot_path = None
+    if DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS > 0:
+        # Probed before the read, so a concurrent insert at worst costs one extra reload
+        fingerprint = get_tickets_fingerprint()
+        if fingerprint is not None:
+            snapshot_path = _snapshot_path(since, fingerprint)
+            snapshot = _read_snapshot(snapshot_path)
+            if snapshot is not None:
+                return (*snapshot, _category_colors(snapshot[0]), loaded_at)
+
+    logging.info(f"Attempting to load data from DB (since={since})...")
+    try:
+        df = get_tickets_df(since=since, columns=DASHBOARD_COLUMNS)
         if df is None or df.empty:
              logging.warning("get_tickets_df() returned None or empty DataFrame.")
-             return pd.DataFrame(), False, False # Return flags indicating missing columns
+             return pd.DataFrame(), False, False, (), loaded_at # Return flags indicating missing columns
 
         logging.info(f"Successfully loaded {len(df)} rows from DB.")
         has_status = 'status' in df.columns
@@ -57,9 +145,12 @@ def load_data():
         # --- Data Cleaning & Feature Engineering ---
         df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
         df.dropna(subset=['created_at'], inplace=True) # Drop rows with invalid creation dates
+        # Newest first, as get_tickets_df() returns it; _date_range_positions() relies on this order
+        if not df['created_at'].is_monotonic_decreasing:
+            df.sort_values('created_at', ascending=False, kind='stable', inplace=True, ignore_index=True)
 
         df['creation_date'] = df['created_at'].dt.date
-        df['creation_day_name'] = df['created_at'].dt.day_name()
+        df['creation_dow'] = df['created_at'].dt.dayofweek.astype('int8') # Monday=0, as in calendar.day_name
         # Ensure Category is treated as string, fillna AFTER type conversion
         df['category'] = df['category'].fillna('Unknown').astype(str)
         df['file_type'] = df['file_type'].fillna('Unknown').astype(str)
@@ -69,20 +160,149 @@ def load_data():
         else:
             df['status'] = 'Unknown'
 
-        df['resolution_time_hours'] = None
+        # Low-cardinality labels as categoricals: isin, counts and groupbys then
+        # work on small integer codes instead of hashing Python strings
+        for col in ('category', 'file_type', 'status'):
+            df[col] = df[col].astype('category')
+
+        # float64 with NaN rather than object with None, so the comparisons
+        # and means over it downstream stay vectorized
+        df['resolution_time_hours'] = np.nan
         if has_resolved_at:
             df['resolved_at'] = pd.to_datetime(df['resolved_at'], errors='coerce')
             if has_status:
                 closed_mask = ( (df['status'] == 'Closed') & df['resolved_at'].notna() & df['created_at'].notna() & (df['resolved_at'] > df['created_at']) )
                 if closed_mask.any():
-                    df.loc[closed_mask, 'resolution_time_hours'] = (df.loc[closed_mask, 'resolved_at'] - df.loc[closed_mask, 'created_at']) / pd.Timedelta(hours=1)
+                    # One timedelta64 subtraction and division over the whole column; NaT becomes NaN
+                    resolution_hours = (df['resolved_at'] - df['created_at']) / np.timedelta64(1, 'h')
+                    df['resolution_time_hours'] = resolution_hours.where(closed_mask)
                     logging.info(f"Calculated resolution time for {closed_mask.sum()} tickets.")
-        return df, has_status, has_resolved_at
+        if snapshot_path is not None:
+            _write_snapshot(snapshot_path, df, has_status, has_resolved_at)
+        return df, has_status, has_resolved_at, _category_colors(df), loaded_at
 
     except Exception as e:
         logging.error(f"Error during data loading or processing: {e}", exc_info=True)
-        return pd.DataFrame(), False, False
-
+        return pd.DataFrame(), False, False, (), loaded_at
+
+
+FILTER_CACHE_TTL_SECONDS = 3600
+
+def _and_masks(mask, other):
+    """ANDs two boolean masks where None stands for "no filter"."""
+    if mask is None:
+        return other
+    return mask if other is None else mask & other
+
+def _label_mask(df, categories, statuses):
+    """Category and status part of the filters as a boolean mask over df, or None when neither filters anything."""
+    mask = None
+
+    # Apply category filter (handle 'All' case)
+    if categories:
+        mask = df['category'].isin(categories)
+
+    # Apply status filter (handle 'All' case)
+    if statuses and 'All' not in statuses:
+        mask = _and_masks(mask, df['status'].isin(statuses))
+    return mask
+
+def _date_range_positions(df, start_date, end_date):
+    """
+    (lo, hi) such that df.iloc[lo:hi] holds the tickets created from start_date
+    through end_date, found by binary search on the newest-first created_at
+    column instead of comparing every row. None for timezone-aware
+    timestamps, whose local creation dates need the row-wise comparison.
+    """
+    created = df['created_at']
+    if created.dt.tz is not None:
+        return None
+    ascending = created.to_numpy()[::-1] # A reversed view, not a copy
+    n = len(ascending)
+    after_end = ascending.searchsorted(np.datetime64(end_date + timedelta(days=1)), side='left')
+    before_start = ascending.searchsorted(np.datetime64(start_date), side='left')
+    return n - after_end, n - before_start
+
+@st.cache_resource(show_spinner=False, ttl=FILTER_CACHE_TTL_SECONDS, max_entries=64)
+def _apply_filters(_df_full, data_version, date_range, categories, statuses, hide_pending):
+    """
+    Applies the sidebar filters and returns (df_display, pending_hidden_count);
+    like load_data's frame, df_display is shared and read-only.
+    Cached on the filter values and data_version; _df_full is not hashed, since
+    hashing the whole frame on every rerun would cost as much as filtering it.
+    date_range is (start_date, end_date), or None for the whole loaded range;
+    categories/statuses are sorted tuples, and empty (or containing 'All' for
+    statuses) means no filter. Filters that select everything add no mask.
+    """
+    # The date range is a contiguous block of the sorted frame: slice it, then
+    # build one combined mask over just that block, so it is indexed once
+    df = _df_full
+    mask = None
+    if date_range is not None:
+        start_date, end_date = date_range
+        positions = _date_range_positions(_df_full, start_date, end_date)
+        if positions is not None:
+            df = _df_full.iloc[positions[0]:positions[1]]
+        else:
+            mask = (_df_full['creation_date'] >= start_date) & (_df_full['creation_date'] <= end_date)
+    mask = _and_masks(mask, _label_mask(df, categories, statuses))
+
+    # --- Apply Hide Pending Filter AFTER other filters ---
+    pending_hidden_count = 0
+    if hide_pending:
+        pending_mask = _and_masks(mask, df['category'] == 'Pending')
+        pending_hidden_count = int(pending_mask.sum())
+        mask = _and_masks(mask, ~pending_mask)
+    return (df if mask is None else df[mask]), pending_hidden_count
+
+@st.cache_data(show_spinner=False, ttl=FILTER_CACHE_TTL_SECONDS, max_entries=64)
+def _daily_counts(_df_full, data_version, categories, statuses, hide_pending):
+    """
+    Tickets created per calendar day over the whole loaded history, after the
+    category/status/hide-pending filters. Not keyed on the date range, so a
+    changed range or aggregation only slices and re-bins this small series.
+    """
+    mask = _label_mask(_df_full, categories, statuses)
+    if hide_pending:
+        mask = _and_masks(mask, _df_full['category'] != 'Pending')
+    created = pd.DatetimeIndex(_df_full['created_at'] if mask is None else _df_full.loc[mask, 'created_at'])
+    if created.tz is not None:
+         created = created.tz_localize(None)
+    # Day ordinals from to_period('D') counted by one bincount: the same gap-filled
+    # series resample('D').size() gives, without building a resampler per group
+    day_ordinals = created.to_period('D').asi8
+    if not len(day_ordinals):
+        return pd.Series([], index=pd.DatetimeIndex([], freq='D').as_unit(created.unit), dtype='int64')
+    first_day = day_ordinals.min()
+    counts = np.bincount(day_ordinals - first_day)
+    days = pd.date_range(pd.Period(ordinal=first_day, freq='D').to_timestamp(), periods=len(counts), freq='D', unit=created.unit)
+    return pd.Series(counts, index=days)
+
+def trend_counts(daily_counts, start_date, end_date, time_agg):
+    """
+    Per-period ticket counts over [start_date, end_date] as a ['time_period',
+    'count'] frame, the same bins resampling the filtered tickets would give:
+    the range is trimmed to its first and last non-empty day, and
+    weekly/monthly bins (which end on a day boundary) are sums of days.
+    """
+    days = daily_counts.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+    nonempty = days.to_numpy().nonzero()[0]
+    days = days.iloc[nonempty[0]:nonempty[-1] + 1] if len(nonempty) else days.iloc[:0]
+    resample_rule = {'Daily': 'D', 'Weekly': 'W-MON', 'Monthly': 'ME'}[time_agg]
+    counts = days if resample_rule == 'D' else days.resample(resample_rule).sum()
+    return counts.rename_axis('time_period').reset_index(name='count')
+
+
+def observed_counts(series, name):
+    """
+    Per-value counts of a categorical series as a [name, 'count'] frame, most
+    frequent first. Grouping on the categorical codes with observed=True counts
+    small ints instead of hashing labels, and skips categories filtered out of
+    the view instead of listing them with a zero count.
+    """
+    counts = series.groupby(series, observed=True, sort=False).size().sort_values(ascending=False, kind='stable')
+    counts = counts.rename_axis(name).reset_index(name='count')
+    return counts
 
 def format_date(dt):
     if pd.isnull(dt): return "N/A"
@@ -99,8 +319,163 @@ def format_timedelta_hours(hours):
     return " ".join(parts) if parts else "0 hrs"
 
 
+# --- Chart Builders ---
+# Cached on plain tuples of the aggregated values (rows of (label, value)), so a
+# rerun with unchanged data reuses the Figure instead of rebuilding it with plotly.express.
+# st.cache_resource, as for load_data: st.cache_data would pickle the Figure and
+# unpickle it (re-running plotly's property validation) on every read.
+# st.plotly_chart only serializes the figure, so the shared one is never modified.
+def _rows(df):
+    """Rows of df as a tuple of plain tuples: a cheap, hashable chart cache key."""
+    return tuple(df.itertuples(index=False, name=None))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _category_fig(counts, colors):
+    """Bar chart of (category, count) rows, colored by the (category, color) pairs."""
+    category_counts = pd.DataFrame(list(counts), columns=['category', 'count'])
+    fig_cat = px.bar(
+        category_counts.sort_values('count', ascending=False), # Sort bars
+        x='category',
+        y='count',
+        title="<b>Ticket Count per Category</b>",
+        labels={'category': 'Category', 'count': 'Number of Tickets'},
+        template="plotly_white",
+        color='category',
+        color_discrete_map=dict(colors) # Apply custom color map
+    )
+    fig_cat.update_layout(
+        title_x=0.5, # Center title
+        xaxis_title=None,
+        yaxis_title="Number of Tickets",
+        showlegend=False # Legend is redundant if bars are colored and labeled
+    )
+    # Customize hover text
+    fig_cat.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
+    return fig_cat
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _trend_fig(counts, time_agg):
+    """Line chart of (time_period, count) rows."""
+    time_counts = pd.DataFrame(list(counts), columns=['time_period', 'count'])
+    fig_trend = px.line(
+        time_counts, x='time_period', y='count',
+        title="<b>Ticket Volume ({time_agg})</b>",
+        labels={'time_period': time_agg + ' Period', 'count': 'Number of Tickets'},
+        template="plotly_white", markers=True
+    )
+    fig_trend.update_layout(
+        title_x=0.5,
+        hovermode="x unified", # Improved hover for line charts
+        yaxis_title="Number of Tickets"
+    )
+    fig_trend.update_traces(hovertemplate='<b>%{x|%Y-%m-%d}</b><br>Tickets: %{y}<extra></extra>')
+    return fig_trend
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _status_fig(counts):
+    """Bar chart of (status, count) rows."""
+    status_counts = pd.DataFrame(list(counts), columns=['status', 'count'])
+    fig_status = px.bar(
+        status_counts.sort_values('count', ascending=False), x='status', y='count',
+        title="<b>Ticket Count by Status</b>", template="plotly_white", color='status'
+    )
+    fig_status.update_layout(title_x=0.5, xaxis_title=None, showlegend=False)
+    fig_status.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
+    return fig_status
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _resolution_fig(rows, colors):
+    """Bar chart of (category, average resolution hours) rows, colored by the (category, color) pairs."""
+    res_time_cat = pd.DataFrame(list(rows), columns=['category', 'resolution_time_hours'])
+    fig_res_cat = px.bar(
+        res_time_cat.sort_values('resolution_time_hours', ascending=False), x='category', y='resolution_time_hours',
+        title="<b>Avg. Resolution Time by Category</b>",
+        labels={'category': 'Category', 'resolution_time_hours': 'Average Hours to Resolve'},
+        template="plotly_white", color='category', color_discrete_map=dict(colors)
+    )
+    fig_res_cat.update_layout(title_x=0.5, xaxis_title=None, showlegend=False)
+    fig_res_cat.update_traces(hovertemplate='<b>%{x}</b><br>Avg Hours: %{y:.1f}<extra></extra>')
+    return fig_res_cat
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _day_fig(counts):
+    """Bar chart of (day, count) rows in the given order."""
+    day_counts = pd.DataFrame(list(counts), columns=['day', 'count'])
+    fig_day = px.bar(
+        day_counts, x='day', y='count',
+        title="<b>Tickets by Day of Week</b>",
+        labels={'day': 'Day of Week', 'count': 'Number of Tickets'}, template="plotly_white"
+    )
+    fig_day.update_layout(title_x=0.5)
+    fig_day.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
+    return fig_day
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _file_type_fig(counts):
+    """Donut chart of (file_type, count) rows."""
+    file_type_counts = pd.DataFrame(list(counts), columns=['file_type', 'count'])
+    fig_file = px.pie(
+        file_type_counts, names='file_type', values='count',
+        title="<b>Tickets by Source File Type</b>", hole=0.4,
+        template="plotly_white", color_discrete_sequence=px.colors.sequential.Blues_r
+    )
+    fig_file.update_layout(title_x=0.5, showlegend=True) # Show legend for pie
+    fig_file.update_traces(textposition='outside', textinfo='percent+label', hovertemplate='<b>%{label}</b><br>Count: %{value}<br>(%{percent})<extra></extra>')
+    return fig_file
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _export_csv_gz(_df_display, columns_to_export, filter_args):
+    """
+    Gzip-compressed CSV bytes of the export columns of the display frame, with
+    datetimes made tz-naive. Cached on columns_to_export and filter_args, the
+    _apply_filters arguments the frame was derived from; _df_display is not
+    hashed, and a cache hit skips the column copy as well as the CSV encoding.
+    """
+    _export_df = _df_display[list(columns_to_export)].copy()
+    # Convert datetimes for CSV
+    for col in ('created_at', 'resolved_at'):
+        if col in columns_to_export and hasattr(_export_df[col].dt, 'tz') and _export_df[col].dt.tz is not None:
+            _export_df[col] = _export_df[col].dt.tz_localize(None)
+    csv_buffer = io.BytesIO()
+    # mtime=0 keeps the bytes identical for identical data
+    _export_df.to_csv(csv_buffer, index=False, encoding='utf-8', compression={'method': 'gzip', 'mtime': 0})
+    return csv_buffer.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _breakdowns(_df_display, filter_args, today):
+    """
+    The small aggregations behind the key metrics and breakdown charts, keyed by
+    chart. Cached on filter_args like _export_csv_gz, so reruns that keep the
+    filters (e.g. a new trend aggregation) reuse them instead of re-scanning df_display;
+    today is part of the key so the "Tickets Today" count rolls over at midnight.
+    """
+    valid_res_df = _df_display[_df_display['resolution_time_hours'] >= 0] # NaN compares False
+    today_positions = _date_range_positions(_df_display, today, today)
+    return {
+        'today': (today_positions[1] - today_positions[0] if today_positions is not None
+                  else int((_df_display['creation_date'] == today).sum())),
+        'avg_resolution_hours': valid_res_df['resolution_time_hours'].mean() if not valid_res_df.empty else None,
+        'category': observed_counts(_df_display['category'], 'category'),
+        'status': observed_counts(_df_display['status'], 'status'),
+        'file_type': observed_counts(_df_display['file_type'], 'file_type'),
+        # One count per weekday code, in calendar order with zeros included
+        'day': pd.DataFrame({
+            'day': list(calendar.day_name),
+            'count': np.bincount(_df_display['creation_dow'].to_numpy(), minlength=7),
+        }),
+        'resolution': valid_res_df.groupby('category', observed=True)['resolution_time_hours'].mean().reset_index(),
+    }
+
+
 # --- Load Data ---
-df_full, has_status_col, has_resolved_col = load_data()
+st.sidebar.header("⚙️ Dashboard Filters")
+load_full_history = st.sidebar.checkbox(
+    "Load full history", value=False,
+    help=f"By default only tickets from the last {DASHBOARD_HISTORY_DAYS} days are loaded."
+)
+# A date, not a datetime, so the cache key only changes once a day
+history_since = None if load_full_history else date.today() - timedelta(days=DASHBOARD_HISTORY_DAYS)
+df_full, has_status_col, has_resolved_col, color_items, data_version = load_data(history_since)
 
 # Display warnings if columns missing (can be commented out if preferred)
 # if not df_full.empty:
@@ -108,10 +483,11 @@ df_full, has_status_col, has_resolved_col = load_data()
 #     if not has_resolved_col: st.sidebar.warning("'resolved_at' column missing.", icon="⚠️")
 
 # --- Sidebar Filters ---
-st.sidebar.header("⚙️ Dashboard Filters")
-
 if df_full.empty:
-    st.warning("⚠️ No ticket data available to display.")
+    if load_full_history:
+        st.warning("⚠️ No ticket data available to display.")
+    else:
+        st.warning(f"⚠️ No tickets from the last {DASHBOARD_HISTORY_DAYS} days. Check 'Load full history' to include older tickets.")
     st.stop()
 
 # Date Range Filter
@@ -146,23 +522,19 @@ time_agg = st.sidebar.radio("Aggregate Trend By:", ('Daily', 'Weekly', 'Monthly'
 
 
 # --- Apply Filters ---
-# Start with base date filter
-df_filtered = df_full[ (df_full['creation_date'] >= start_date) & (df_full['creation_date'] <= end_date) ]
-
-# Apply category filter (handle 'All' case)
-if not show_all_categories:
-    df_filtered = df_filtered[df_filtered['category'].isin(selected_categories)]
-
-# Apply status filter (handle 'All' case)
-if has_status_col and 'All' not in selected_status and selected_status:
-    df_filtered = df_filtered[df_filtered['status'].isin(selected_status)]
-
-# --- Apply Hide Pending Filter AFTER other filters ---
+# Widget reruns with unchanged filters (e.g. switching time_agg) reuse the cached slice.
+# Sorted tuples make the selections hashable and independent of selection order.
+# Selections that include every value are passed as "no filter", so they skip the
+# mask entirely and share one cache entry
+selects_all_categories = show_all_categories or set(selected_categories) >= set(all_categories)
+category_filter = () if selects_all_categories else tuple(sorted(selected_categories))
+selects_all_status = not has_status_col or set(selected_status) >= set(all_status[1:])
+status_filter = () if selects_all_status else tuple(sorted(selected_status))
+full_date_range = start_date <= min_date and end_date >= max_date
+filter_args = (data_version, None if full_date_range else (start_date, end_date), category_filter, status_filter, hide_pending)
+df_display, pending_hidden_count = _apply_filters(df_full, *filter_args)
 if hide_pending:
-     df_display = df_filtered[df_filtered['category'] != 'Pending'].copy()
      st.sidebar.info(f"Hiding tickets with 'Pending' category.")
-else:
-     df_display = df_filtered.copy() # Use the filtered data directly
 
 if df_display.empty:
     st.warning(f"⚠️ No ticket data found for the selected filters (including 'Hide Pending' if checked).")
@@ -170,12 +542,20 @@ if df_display.empty:
 
 
 # --- Dashboard Metrics ---
+# Read off the cached aggregations rather than scanning df_display once per metric
+breakdowns = _breakdowns(df_display, filter_args, date.today())
 st.header("📊 Key Metrics Overview")
 with st.container(border=True): # Group metrics visually
+    category_counts = breakdowns['category']
     total_tickets_d = len(df_display)
-    tickets_today_d = len(df_display[df_display['creation_date'] == date.today()])
-    unique_categories_d = df_display['category'].nunique() # Based on displayed data
-    most_common_category_d = df_display['category'].mode()[0] if not df_display.empty else "N/A"
+    tickets_today_d = breakdowns['today']
+    unique_categories_d = len(category_counts) # Based on displayed data
+    if not category_counts.empty:
+        # Ties go to the first name alphabetically, as Series.mode() orders them
+        top_count = category_counts['count'].iloc[0]
+        most_common_category_d = min(category_counts.loc[category_counts['count'] == top_count, 'category'].astype(str))
+    else:
+        most_common_category_d = "N/A"
 
     open_tickets_d = 'N/A'
     closed_tickets_d = 'N/A'
@@ -183,13 +563,12 @@ with st.container(border=True): # Group metrics visually
 
     if has_status_col:
         open_statuses = ['Open', 'In Progress', 'Pending', 'New', 'Reopened'] # Adjust as needed
-        open_tickets_d = df_display[df_display['status'].isin(open_statuses)].shape[0]
-        closed_tickets_d = df_display[df_display['status'] == 'Closed'].shape[0]
+        status_totals = dict(breakdowns['status'].itertuples(index=False, name=None))
+        open_tickets_d = sum(status_totals.get(status, 0) for status in open_statuses)
+        closed_tickets_d = status_totals.get('Closed', 0)
 
     if has_resolved_col and 'resolution_time_hours' in df_display.columns:
-        valid_res_times = df_display.loc[df_display['resolution_time_hours'].notna() & (df_display['resolution_time_hours'] >= 0), 'resolution_time_hours']
-        if not valid_res_times.empty:
-            avg_res_time_d = valid_res_times.mean()
+        avg_res_time_d = breakdowns['avg_resolution_hours']
 
     # Display metrics in columns
     metric_cols = st.columns(4)
@@ -210,7 +589,7 @@ with st.container(border=True): # Group metrics visually
             metric_cols_2[col_idx].metric("Avg. Resolution Time", format_timedelta_hours(avg_res_time_d), help="Average time (Created to Resolved) for 'Closed' tickets shown.")
             col_idx += 1
 
-st.caption(f"Displaying data from {format_date(start_date)} to {format_date(end_date)}. {len(df_filtered) - len(df_display) if hide_pending else 0} 'Pending' tickets hidden.")
+st.caption(f"Displaying data from {format_date(start_date)} to {format_date(end_date)}. {pending_hidden_count} 'Pending' tickets hidden.")
 st.divider()
 
 
@@ -236,12 +615,6 @@ st.divider()
 # --- Visualizations ---
 st.header("📈 Data Visualizations")
 
-# Define colors - explicitly set 'Pending' and 'Unknown' to gray
-category_colors = px.colors.qualitative.Pastel # Base palette
-color_map = {cat: color for cat, color in zip(df_display['category'].unique(), category_colors)}
-color_map['Pending'] = '#CCCCCC' # Assign gray to Pending
-color_map['Unknown'] = '#E0E0E0' # Assign slightly different gray to Unknown
-
 # Define tabs dynamically based on available data
 viz_tabs_list = ["📊 By Category", "📅 Over Time", "🧩 Other Breakdowns"] # Reorganize tabs
 status_resolution_tab_name = "⏳ Status & Resolution"
@@ -255,29 +628,8 @@ tab_map = {name: tab for name, tab in zip(viz_tabs_list, tabs)}
 with tab_map["📊 By Category"]:
     st.subheader("Ticket Distribution by Category")
     st.markdown("Shows the number of tickets for each category based on the filters applied.")
-    category_counts = df_display['category'].value_counts().reset_index()
-    category_counts.columns = ['category', 'count']
-
     if not category_counts.empty:
-        fig_cat = px.bar(
-            category_counts.sort_values('count', ascending=False), # Sort bars
-            x='category',
-            y='count',
-            title="<b>Ticket Count per Category</b>",
-            labels={'category': 'Category', 'count': 'Number of Tickets'},
-            template="plotly_white",
-            color='category',
-            color_discrete_map=color_map # Apply custom color map
-        )
-        fig_cat.update_layout(
-            title_x=0.5, # Center title
-            xaxis_title=None,
-            yaxis_title="Number of Tickets",
-            showlegend=False # Legend is redundant if bars are colored and labeled
-        )
-        # Customize hover text
-        fig_cat.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
-        st.plotly_chart(fig_cat, use_container_width=True)
+        st.plotly_chart(_category_fig(_rows(category_counts), color_items), use_container_width=True)
 
         # Optional: Add summary table next to chart
         # with st.container():
@@ -291,28 +643,12 @@ with tab_map["📅 Over Time"]:
     st.subheader(f"Ticket Volume Over Time ({time_agg})")
     st.markdown(f"Shows the number of tickets created per {time_agg.lower()} based on the filters.")
     try:
-        df_time_indexed = df_display.set_index(pd.to_datetime(df_display['created_at']))
-        if df_time_indexed.index.tz is not None:
-             df_time_indexed.index = df_time_indexed.index.tz_localize(None)
-
-        resample_rule = {'Daily': 'D', 'Weekly': 'W-MON', 'Monthly': 'ME'}[time_agg]
-        time_counts = df_time_indexed.resample(resample_rule).size().reset_index(name='count')
-        time_counts.columns = ['time_period', 'count']
+        # Daily counts are computed once per label filter; the date range and aggregation only slice and re-bin them
+        daily_counts = _daily_counts(df_full, data_version, category_filter, status_filter, hide_pending)
+        time_counts = trend_counts(daily_counts, start_date, end_date, time_agg)
 
         if not time_counts.empty:
-            fig_trend = px.line(
-                time_counts, x='time_period', y='count',
-                title="<b>Ticket Volume ({time_agg})</b>",
-                labels={'time_period': time_agg + ' Period', 'count': 'Number of Tickets'},
-                template="plotly_white", markers=True
-            )
-            fig_trend.update_layout(
-                title_x=0.5,
-                hovermode="x unified", # Improved hover for line charts
-                yaxis_title="Number of Tickets"
-            )
-            fig_trend.update_traces(hovertemplate='<b>%{x|%Y-%m-%d}</b><br>Tickets: %{y}<extra></extra>')
-            st.plotly_chart(fig_trend, use_container_width=True)
+            st.plotly_chart(_trend_fig(_rows(time_counts), time_agg), use_container_width=True)
         else: st.info("No trend data for the selected period/aggregation.")
     except Exception as e:
         logging.error(f"Error creating trend chart: {e}", exc_info=True)
@@ -327,36 +663,18 @@ if status_resolution_tab_name in tab_map:
             col_status_dist, col_res_time = st.columns(2)
             with col_status_dist:
                 st.markdown("###### Status Distribution")
-                status_counts = df_display['status'].value_counts().reset_index()
-                status_counts.columns = ['status', 'count']
+                status_counts = breakdowns['status']
                 if not status_counts.empty:
-                    fig_status = px.bar(
-                        status_counts.sort_values('count', ascending=False), x='status', y='count',
-                        title="<b>Ticket Count by Status</b>", template="plotly_white", color='status'
-                    )
-                    fig_status.update_layout(title_x=0.5, xaxis_title=None, showlegend=False)
-                    fig_status.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
-                    st.plotly_chart(fig_status, use_container_width=True)
+                    st.plotly_chart(_status_fig(_rows(status_counts)), use_container_width=True)
                 else: st.info("No status data.")
 
             with col_res_time:
                 st.markdown("###### Avg. Resolution Time")
                 if has_resolved_col and 'resolution_time_hours' in df_display.columns:
                     st.markdown("Average time (in hours) for 'Closed' tickets, grouped by Category.")
-                    valid_res_df = df_display[df_display['resolution_time_hours'].notna() & (df_display['resolution_time_hours'] >= 0)]
-                    if not valid_res_df.empty:
-                        res_time_cat = valid_res_df.groupby('category')['resolution_time_hours'].mean().reset_index()
-                        if not res_time_cat.empty:
-                            fig_res_cat = px.bar(
-                                res_time_cat.sort_values('resolution_time_hours', ascending=False), x='category', y='resolution_time_hours',
-                                title="<b>Avg. Resolution Time by Category</b>",
-                                labels={'category': 'Category', 'resolution_time_hours': 'Average Hours to Resolve'},
-                                template="plotly_white", color='category', color_discrete_map=color_map
-                            )
-                            fig_res_cat.update_layout(title_x=0.5, xaxis_title=None, showlegend=False)
-                            fig_res_cat.update_traces(hovertemplate='<b>%{x}</b><br>Avg Hours: %{y:.1f}<extra></extra>')
-                            st.plotly_chart(fig_res_cat, use_container_width=True)
-                        else: st.info("Could not calculate resolution time per category.")
+                    res_time_cat = breakdowns['resolution']
+                    if not res_time_cat.empty:
+                        st.plotly_chart(_resolution_fig(_rows(res_time_cat), color_items), use_container_width=True)
                     else: st.info("No valid resolution time data found for this period.")
                 else:
                     st.info("Resolution time data not available.")
@@ -372,34 +690,16 @@ with other_breakdown_tab:
 
     with col_dow:
         st.markdown("###### By Day of Week Created")
-        day_counts = df_display['creation_day_name'].value_counts()
-        day_order = list(calendar.day_name)
-        day_counts = day_counts.reindex(day_order).fillna(0).reset_index()
-        day_counts.columns = ['day', 'count']
-        if not day_counts[day_counts['count'] > 0].empty:
-            fig_day = px.bar(
-                day_counts, x='day', y='count',
-                title="<b>Tickets by Day of Week</b>",
-                labels={'day': 'Day of Week', 'count': 'Number of Tickets'}, template="plotly_white"
-            )
-            fig_day.update_layout(title_x=0.5)
-            fig_day.update_traces(hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>')
-            st.plotly_chart(fig_day, use_container_width=True)
+        day_counts = breakdowns['day']
+        if day_counts['count'].any():
+            st.plotly_chart(_day_fig(_rows(day_counts)), use_container_width=True)
         else: st.info("No day-of-week data.")
 
     with col_file:
          st.markdown("###### By Source File Type")
-         file_type_counts = df_display['file_type'].value_counts().reset_index()
-         file_type_counts.columns = ['file_type', 'count']
+         file_type_counts = breakdowns['file_type']
          if not file_type_counts.empty:
-            fig_file = px.pie(
-                file_type_counts, names='file_type', values='count',
-                title="<b>Tickets by Source File Type</b>", hole=0.4,
-                template="plotly_white", color_discrete_sequence=px.colors.sequential.Blues_r
-            )
-            fig_file.update_layout(title_x=0.5, showlegend=True) # Show legend for pie
-            fig_file.update_traces(textposition='outside', textinfo='percent+label', hovertemplate='<b>%{label}</b><br>Count: %{value}<br>(%{percent})<extra></extra>')
-            st.plotly_chart(fig_file, use_container_width=True)
+            st.plotly_chart(_file_type_fig(_rows(file_type_counts)), use_container_width=True)
          else: st.info("No file type data.")
 
 
@@ -423,21 +723,11 @@ with st.container(border=True):
         columns_to_export = [col for col in desired_export_columns if col in existing_columns_in_display]
 
         if columns_to_export:
-            export_df = df_display[columns_to_export].copy()
-            # Convert datetimes for CSV
-            if 'created_at' in columns_to_export and hasattr(export_df['created_at'].dt, 'tz') and export_df['created_at'].dt.tz is not None:
-                export_df['created_at'] = export_df['created_at'].dt.tz_localize(None)
-            if 'resolved_at' in columns_to_export and hasattr(export_df['resolved_at'].dt, 'tz') and export_df['resolved_at'].dt.tz is not None:
-                export_df['resolved_at'] = export_df['resolved_at'].dt.tz_localize(None)
-
             try:
-                csv_buffer = io.BytesIO()
-                export_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                csv_buffer.seek(0)
-                csv_data = csv_buffer.read()
+                csv_data = _export_csv_gz(df_display, tuple(columns_to_export), filter_args)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-                st.download_button( label="📥 Download Shown Data as CSV", data=csv_data, file_name=f'displayed_tickets_{timestamp}.csv', mime='text/csv', help="Download the data currently shown based on filters")
+                st.download_button( label="📥 Download Shown Data as CSV", data=csv_data, file_name=f'displayed_tickets_{timestamp}.csv.gz', mime='application/gzip', help="Download the data currently shown based on filters (gzip-compressed CSV)")
             except Exception as e:
                  logging.error(f"Error creating CSV for download: {e}", exc_info=True)
                  st.error("Could not prepare data for download.")
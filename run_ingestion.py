@@ -1,7 +1,10 @@
 # File path: run_ingestion.py
 #!/usr/bin/env python3
 import logging # Ensure logging is imported first
+import os
+import queue
 import sys
+import threading
 from pathlib import Path
 
 # --- Basic Logging Configuration (AT THE VERY TOP) ---
@@ -26,77 +29,100 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
     logger.info(f"Added project root to sys.path: {PROJECT_ROOT}")
 
-# --- Imports (Now should work reliably) ---
-try:
-    from backend.ingestion import ingest_documents
-    from scripts.create_sample_data import create_samples # Assuming create_sample_data.py is in scripts/
-except ImportError as e:
-    logger.error(f"Failed to import modules. Is the script run correctly relative to the project root? Error: {e}", exc_info=True)
-    logger.error(f"Current sys.path: {sys.path}")
-    logger.error(f"PROJECT_ROOT was set to: {PROJECT_ROOT}")
-    sys.exit(1)
-except Exception as ex:
-    logger.error(f"An unexpected error occurred during imports: {ex}", exc_info=True)
-    sys.exit(1)
+SAMPLE_COUNT = 35
+# Formats generated for each sample ticket, e.g. SAMPLE_FORMATS=txt for a quick run;
+# the default exercises every document loader ingest_documents supports
+SAMPLE_FORMATS = tuple(f.strip().lower() for f in (os.getenv("SAMPLE_FORMATS") or "txt,pdf,docx").split(",") if f.strip())
+
+class SampleGenerationError(Exception):
+    """Raised into ingestion when the sample generator thread fails."""
 
 # --- Main Function ---
 def main():
     logger.info("--- Starting run_ingestion.py script ---")
+    # --- Imports (Now should work reliably) ---
+    # Inside main(), not at module level: the ingestion and sample pools'
+    # workers re-import this script as __mp_main__, and importing backend.ingestion
+    # there would give every worker its own database engine and test connection
+    try:
+        from backend.ingestion import ingest_documents
+        from scripts.create_sample_data import create_samples # Assuming create_sample_data.py is in scripts/
+    except ImportError as e:
+        logger.error(f"Failed to import modules. Is the script run correctly relative to the project root? Error: {e}", exc_info=True)
+        logger.error(f"Current sys.path: {sys.path}")
+        logger.error(f"PROJECT_ROOT was set to: {PROJECT_ROOT}")
+        sys.exit(1)
+    except Exception as ex:
+        logger.error(f"An unexpected error occurred during imports: {ex}", exc_info=True)
+        sys.exit(1)
+
     # Define directory relative to project root
     sample_data_dir = PROJECT_ROOT / "database" / "sample_data"
-    expected_file_count = 105 # 35 samples * 3 file types
+    expected_file_count = SAMPLE_COUNT * len(SAMPLE_FORMATS)
 
     logger.info(f"Target sample data directory: {sample_data_dir.resolve()}")
 
-    # Ensure the sample data directory exists
-    try:
-        sample_data_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"Ensured directory exists: {sample_data_dir.resolve()}")
-    except OSError as e:
-        logger.error(f"Failed to create directory {sample_data_dir}: {e}", exc_info=True)
-        sys.exit(1)
+    # create_samples creates the directory if needed (errors surface through the producer thread)
 
     # --- Generate Sample Data ---
-    logger.info(f"Generating {expected_file_count} sample files in {sample_data_dir}...")
-    try:
-        create_samples(output_dir=str(sample_data_dir), count=35)
-        logger.info("Sample data generation attempt complete.")
-    except Exception as e:
-        logger.error(f"Error during create_samples execution: {e}", exc_info=True)
-        sys.exit(1)
+    # create_samples runs in a producer thread and queues each file as soon as it
+    # is written; ingest_documents consumes the queue, so parsing overlaps generation
+    file_queue = queue.Queue()
+    generation_errors = []
+
+    def generate_samples():
+        try:
+            create_samples(output_dir=str(sample_data_dir), count=SAMPLE_COUNT, on_file_written=file_queue.put, formats=SAMPLE_FORMATS)
+            logger.info("Sample data generation attempt complete.")
+        except Exception as e:
+            logger.error(f"Error during create_samples execution: {e}", exc_info=True)
+            generation_errors.append(e)
+        finally:
+            file_queue.put(None) # End of stream
+
+    # --- Generated File Tally ---
+    # A running per-extension count of the files create_samples reported as
+    # ingestion takes them off the queue. Not an on-disk check: a failed write
+    # raises inside create_samples and aborts the run via SampleGenerationError
+    extension_counts = {f".{file_format}": 0 for file_format in SAMPLE_FORMATS}
+    sample_file_names = [] # First few names, logged if the count is off
+
+    def generated_files():
+        for filepath in iter(file_queue.get, None):
+            name = filepath.name
+            extension = os.path.splitext(name)[1].lower()
+            if name.startswith('ticket_') and extension in extension_counts:
+                extension_counts[extension] += 1
+                if len(sample_file_names) < 15:
+                    sample_file_names.append(name)
+                yield filepath
+        if generation_errors:
+            # Raised before ingest_documents inserts anything, so a failed run stores nothing
+            raise SampleGenerationError("Sample data generation failed, aborting ingestion.") from generation_errors[0]
 
-    # --- Verification Step ---
-    logger.info(f"Verifying files in {sample_data_dir.resolve()}...")
-    actual_count = 0
+    logger.info(f"Generating {expected_file_count} sample files in {sample_data_dir} and ingesting them as they are written...")
+    producer = threading.Thread(target=generate_samples, name="create_samples", daemon=True)
+    producer.start()
     try:
-        found_files = list(sample_data_dir.glob('ticket_*.txt'))
-        found_files.extend(list(sample_data_dir.glob('ticket_*.pdf')))
-        found_files.extend(list(sample_data_dir.glob('ticket_*.docx')))
-
-        actual_count = len(found_files)
-        logger.info(f"Verification found {actual_count} files matching ticket_*.{{txt,pdf,docx}} pattern.")
-
-        if actual_count != expected_file_count:
-             logger.warning(f"Expected {expected_file_count} files, but verification found {actual_count}.")
-             txt_count = len(list(sample_data_dir.glob('ticket_*.txt')))
-             pdf_count = len(list(sample_data_dir.glob('ticket_*.pdf')))
-             docx_count = len(list(sample_data_dir.glob('ticket_*.docx')))
-             logger.warning(f"Counts: TXT={txt_count}, PDF={pdf_count}, DOCX={docx_count}")
-             logger.info(f"Sample of files found by verification: {[f.name for f in found_files[:15]]}")
-        else:
-            logger.info(f"Successfully verified {actual_count} files.")
-
-    except Exception as e:
-        logger.error(f"Error during file verification step: {e}", exc_info=True)
+        ingest_documents(str(sample_data_dir), files=generated_files()) # This function is from backend.ingestion
+    except SampleGenerationError as e:
+        logger.error(str(e))
         sys.exit(1)
+    finally:
+        producer.join()
 
-    if actual_count == 0:
-        logger.error("Verification found zero matching files. Aborting ingestion.")
+    reported_count = sum(extension_counts.values())
+    logger.info(f"create_samples reported {reported_count} files matching ticket_*.{{{','.join(SAMPLE_FORMATS)}}}.")
+    if reported_count == 0:
+        logger.error("create_samples reported no matching files. Nothing was ingested.")
         sys.exit(1)
+    if reported_count != expected_file_count:
+         logger.warning(f"Expected {expected_file_count} files, but create_samples reported {reported_count}.")
+         logger.warning(f"Counts: {', '.join(f'{ext[1:].upper()}={n}' for ext, n in extension_counts.items())}")
+         logger.info(f"Sample of reported files: {sample_file_names}")
+    else:
+        logger.info(f"All {reported_count} expected sample files were generated and handed to ingestion.")
 
-    # --- Start Ingestion ---
-    logger.info(f"Starting ingestion process for directory: {sample_data_dir}...")
-    ingest_documents(str(sample_data_dir)) # This function is from backend.ingestion
     logger.info("Ingestion process finished.")
     logger.info("--- run_ingestion.py script finished ---")
 
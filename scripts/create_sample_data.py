@@ -1,5 +1,10 @@
 # File path: scripts/create_sample_data.py
 import os
+import copy
+import functools
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
 from docx import Document
 from fpdf import FPDF
@@ -7,44 +12,127 @@ import random
 from pathlib import Path
 import logging
 
-fake = Faker()
+# Project root on the path when run directly as python scripts/create_sample_data.py
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from data_processing.workers import POOL_CONTEXT # Shared with ingestion's pools
+
+# Only the providers generate_tickets uses; loading all of them costs ~30 ms per Faker()
+fake = Faker(providers=["faker.providers.person", "faker.providers.lorem"])
 categories = ["Network Security", "Phishing", "Malware", "Access Control", "Data Leak"]
+priorities = ["Low", "Medium", "High"]
+
+def generate_tickets(count):
+    """Generates count (title, description) pairs, drawing each field for the whole batch in one go."""
+    ticket_categories = random.choices(categories, k=count)
+    ticket_priorities = random.choices(priorities, k=count)
+    case_ids = [uuid.uuid4().hex[:8] for _ in range(count)]
+    names = [fake.name() for _ in range(count)]
+    paragraphs = [fake.paragraph() for _ in range(count)]
+    return [
+        (f"{category} Case - {case_id}", f"Reported by {name}\n\n{paragraph}\n\nPriority: {priority}")
+        for category, case_id, name, paragraph, priority
+        in zip(ticket_categories, case_ids, names, paragraphs, ticket_priorities)
+    ]
+
+@functools.lru_cache(maxsize=1)
+def _blank_document():
+    """
+    Blank DOCX built once per process. Document() unzips and parses the
+    default template every time; deep-copying the parsed tree is cheaper.
+    Never modified itself, only copied.
+    """
+    return Document()
+
+def _write_file(path, data):
+    """
+    Writes bytes to path with os.write, without a buffered file object. One
+    call normally writes everything; short writes are continued from where they stopped.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        remaining = memoryview(data)
+        while remaining:
+            remaining = remaining[os.write(fd, remaining):]
+    finally:
+        os.close(fd)
+
+def _write_txt(path, title, desc, body):
+    _write_file(path, body.encode('utf-8'))
+
+def _write_pdf(path, title, desc, body):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", size=12) # The core font "Arial" is only an alias fpdf2 warns about
+    pdf.multi_cell(0, 10, body)
+    _write_file(path, pdf.output()) # output() without a name renders to an in-memory bytearray
 
-def generate_ticket(i):
-    return {
-        "title": f"{random.choice(categories)} Case - {fake.uuid4()[:8]}",
-        "desc": f"Reported by {fake.name()}\n\n{fake.paragraph()}\n\nPriority: {random.choice(['Low','Medium','High'])}"
-    }
+def _write_docx(path, title, desc, body):
+    doc = copy.deepcopy(_blank_document())
+    doc.add_heading(title, level=1)
+    doc.add_paragraph(desc)
+    doc.save(path)
+
+# Supported sample formats, in the order each ticket's files are written
+_WRITERS = {
+    "txt": _write_txt,
+    "pdf": _write_pdf,
+    "docx": _write_docx,
+}
+SAMPLE_FORMATS = tuple(_WRITERS)
+
+def _build_one(args):
+    """Worker: writes one ticket's file in each of formats and returns their paths."""
+    i, output_dir, title, desc, formats = args
+    output_dir = Path(output_dir)
+    body = f"{title}\n\n{desc}" # Shared by the TXT and PDF
+    paths = []
+    for file_format in formats:
+        path = output_dir / f"ticket_{i}.{file_format}"
+        _WRITERS[file_format](path, title, desc, body)
+        paths.append(path)
+    return paths
+
+def create_samples(output_dir="database/sample_data", count=100, on_file_written=None, formats=SAMPLE_FORMATS):
+    """
+    Writes count sample tickets into output_dir, one file per ticket in each
+    of formats (any of SAMPLE_FORMATS), one ticket per task across a process
+    pool (the PDF/DOCX serialization is CPU-bound). TXT is by far the cheapest
+    to write, so pass formats=("txt",) when the other loaders need no exercise.
+    on_file_written, if given, is called with each file's Path once its
+    ticket is complete, in ticket order, so a consumer can start on it before
+    the rest are written.
+    """
+    formats = tuple(formats)
+    unknown_formats = set(formats) - set(_WRITERS)
+    if unknown_formats:
+        raise ValueError(f"Unsupported sample formats: {sorted(unknown_formats)}. Supported: {list(SAMPLE_FORMATS)}")
 
-def create_samples(output_dir="database/sample_data", count=100):
     output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True, parents=True)
-    
-    # Clear existing samples
-    for f in output_dir.glob("ticket_*"):
-        f.unlink()
-
-    logging.info(f"Generating {count*3} sample files...")
-    
-    for i in range(1, count+1):
-        ticket = generate_ticket(i)
-        base_name = f"ticket_{i}"
-        
-        # TXT
-        (output_dir / f"{base_name}.txt").write_text(f"{ticket['title']}\n\n{ticket['desc']}")
-        
-        # PDF
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, f"{ticket['title']}\n\n{ticket['desc']}")
-        pdf.output(output_dir / f"{base_name}.pdf")
-        
-        # DOCX
-        doc = Document()
-        doc.add_heading(ticket['title'], level=1)
-        doc.add_paragraph(ticket['desc'])
-        doc.save(output_dir / f"{base_name}.docx")
+    try:
+        output_dir.mkdir(parents=True)
+    except FileExistsError:
+        # Clear existing samples in one directory pass. Not rmtree: the
+        # directory also holds non-sample files (e.g. schema.sql)
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("ticket_") and entry.is_file(follow_symlinks=False):
+                    os.unlink(entry.path)
+
+    logging.info(f"Generating {count*len(formats)} sample files ({', '.join(formats)})...")
+    if count < 1 or not formats:
+        return
+
+    # Ticket text is generated up front in the parent, so the workers only
+    # render files and the output follows the parent's random and Faker state
+    args = [(i, str(output_dir), title, desc, formats) for i, (title, desc) in enumerate(generate_tickets(count), start=1)]
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, count), mp_context=POOL_CONTEXT) as executor:
+        for paths in executor.map(_build_one, args):
+            if on_file_written:
+                for path in paths:
+                    on_file_written(path)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
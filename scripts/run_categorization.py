@@ -1,10 +1,11 @@
 # File path: scripts/run_categorization.py
 #!/usr/bin/env python3
 import sys
+import argparse
+from itertools import chain
 from pathlib import Path
-import pandas as pd
 import logging
-import time # Import time for potential delays between batches
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
 # --- Setup Project Root and Path ---
 # This assumes run_categorization.py is in the 'scripts' directory.
@@ -34,8 +35,9 @@ logger = logging.getLogger("CATEGORIZER_SCRIPT") # Logger for this script
 # --- Imports (After path and logging setup) ---
 try:
     from backend.db import engine # For database connection
-    from backend.openai_agent import categorize_ticket_batch
+    from backend.openai_agent import categorize_ticket_batch, submit_categorization_batch
     from sqlalchemy import text, exc as sqlalchemy_exc
+    from openai import RateLimitError
 except ImportError as e:
     logger.error(f"ERROR: Failed to import modules: {e}", exc_info=True)
     logger.error(f"Current sys.path: {sys.path}")
@@ -45,80 +47,134 @@ except Exception as ex:
     sys.exit(1)
 
 
+DEFAULT_CONCURRENCY = 4 # Batches categorized at once; the API calls are network-bound
+MAX_DESC_LEN = 500 # Max description length to send to OpenAI for categorization
+PENDING_PAGE_BATCHES = 8 # Batches fetched per pending-tickets query
+
+
 # --- Database Functions (Specific to this script) ---
-def get_pending_tickets():
-    """Fetches ID, title, and description of tickets with category 'Pending' or NULL."""
+def iter_pending_batches(batch_size):
+    """
+    Yields lists of (id, title, description) rows for tickets with category
+    'Pending', NULL or empty, batch_size rows at a time. Rows are read in
+    pages of PENDING_PAGE_BATCHES batches by keyset pagination on id, so each
+    query is short and no connection is held while batches are categorized.
+    """
     if engine is None:
         logger.error("Database engine not available (db.py reported an issue). Cannot fetch pending tickets.")
-        return pd.DataFrame()
-    query = text("SELECT id, title, description FROM tickets WHERE category = 'Pending' OR category IS NULL OR category = ''")
+        return
+    # Descriptions are cut to MAX_DESC_LEN in SQL, so the rest is never sent over the wire.
+    # One arm per pending value, so each is a range scan on idx_category_id
+    # (category, id) that stops after page_size rows; an OR across the values
+    # cannot be read from the index in id order
+    pending_arm = (
+        "SELECT * FROM (SELECT id, title, SUBSTR(description, 1, :max_desc_len) AS description FROM tickets "
+        "WHERE {predicate} AND id > :last_id ORDER BY id LIMIT :page_size) AS {alias}"
+    )
+    query = text(
+        " UNION ALL ".join((
+            pending_arm.format(predicate="category = 'Pending'", alias="pending"),
+            pending_arm.format(predicate="category = ''", alias="empty"),
+            pending_arm.format(predicate="category IS NULL", alias="unset"),
+        )) + " ORDER BY id LIMIT :page_size"
+    )
+    page_size = batch_size * PENDING_PAGE_BATCHES
+    last_id = 0
     logger.info("Fetching tickets with category 'Pending', NULL, or empty...")
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
-            logger.info(f"Found {len(df)} tickets with category 'Pending', NULL, or empty.")
-            return df
-    except Exception as e:
-        logger.error(f"Error fetching pending tickets: {e}", exc_info=True)
-        return pd.DataFrame()
-
-def update_ticket_category(ticket_id, new_category):
-    """Updates the category for a specific ticket ID."""
+    while True:
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(query, {"max_desc_len": MAX_DESC_LEN, "last_id": last_id, "page_size": page_size}).all()
+        except Exception as e:
+            logger.error(f"Error fetching pending tickets after ID {last_id}: {e}", exc_info=True)
+            return
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size] # Rows are read-only tuples already; no copy needed
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+def update_ticket_categories(categories_by_id):
+    """
+    Writes {ticket_id: category} with one executemany UPDATE in a single
+    transaction. Returns the number of rows updated (0 on failure).
+    """
     if engine is None:
-        logger.error(f"Database engine not available. Cannot update ticket ID {ticket_id}.")
-        return False
+        logger.error(f"Database engine not available. Cannot update {len(categories_by_id)} tickets.")
+        return 0
+    if not categories_by_id:
+        return 0
     update_stmt = text("UPDATE tickets SET category = :category WHERE id = :id")
-    logger.debug(f"Updating ticket ID {ticket_id} to category '{new_category}'...")
+    params = [{"id": ticket_id, "category": category} for ticket_id, category in categories_by_id.items()]
     try:
-        with engine.connect() as conn:
-            result = conn.execute(update_stmt, {"category": new_category, "id": ticket_id})
-            conn.commit()
-            if result.rowcount > 0:
-                logger.debug(f"Successfully updated ticket ID {ticket_id} to '{new_category}'.")
-                return True
-            else:
-                logger.warning(f"No rows updated for ticket ID {ticket_id} (category may already be '{new_category}' or ID not found).")
-                return False # Or True if no update needed is considered success
+        with engine.begin() as conn:
+            result = conn.execute(update_stmt, params)
+            # Summed over the executemany; drivers that cannot report it give -1
+            updated = result.rowcount if result.rowcount >= 0 else len(params)
+        if updated < len(params):
+            logger.warning(f"Only {updated} of {len(params)} tickets were updated (the rest matched no ticket ID).")
+        return updated
     except Exception as e:
-        logger.error(f"Error updating category for ticket ID {ticket_id} to '{new_category}': {e}", exc_info=True)
-        return False
+        logger.error(f"Error updating categories for {len(params)} tickets: {e}", exc_info=True)
+        return 0
 
 # --- BATCH PROCESSING FUNCTION ---
-def process_batch(batch_df, target_categories):
-    """Processes a single batch of tickets for categorization."""
-    if batch_df.empty:
+def process_batch(batch_rows, target_categories, use_batch_api=False):
+    """Processes a single batch of (id, title, description) tickets for categorization."""
+    if not batch_rows:
         return {}
 
-    batch_size = len(batch_df)
+    batch_size = len(batch_rows)
     logger.info(f"-- Processing batch of {batch_size} tickets --")
 
-    MAX_DESC_LEN = 500 # Max description length to send to OpenAI for categorization
-    texts_to_categorize = [
-        f"Title: {row['title']}\nDescription: {str(row['description'])[:MAX_DESC_LEN]}"
-        for index, row in batch_df.iterrows()
-    ]
-    batch_ticket_ids = batch_df['id'].tolist()
+    # Descriptions arrive already truncated to MAX_DESC_LEN (see iter_pending_batches)
+    texts_to_categorize = [f"Title: {title}\nDescription: {description}" for _, title, description in batch_rows]
+    batch_ticket_ids = [ticket_id for ticket_id, _, _ in batch_rows]
 
-    predicted_categories = categorize_ticket_batch(texts_to_categorize, categories=target_categories)
+    try:
+        if use_batch_api:
+            predicted_categories = submit_categorization_batch(texts_to_categorize, categories=target_categories)
+        else:
+            predicted_categories = categorize_ticket_batch(texts_to_categorize, categories=target_categories)
+    except RateLimitError as e:
+        # openai_agent already backed off on every 429 (pausing all batches);
+        # these tickets stay Pending for the next run instead of aborting this one
+        logger.error(f"Batch still rate limited after retries, leaving its {batch_size} tickets Pending: {e}")
+        return None
 
     if not predicted_categories or len(predicted_categories) != batch_size:
         logger.error(f"Categorization returned an invalid list or wrong number of items. Expected {batch_size}, got {len(predicted_categories if predicted_categories else [])}.")
         return None # Indicates failure for this batch
 
     # Check for error strings returned by categorize_ticket_batch itself
-    if any("Error:" in str(cat) for cat in predicted_categories):
+    failed_count = sum("Error:" in str(cat) for cat in predicted_categories)
+    if failed_count == batch_size:
         logger.error(f"Failed to categorize batch due to errors from categorize_ticket_batch: {predicted_categories}")
-        # Log the first error encountered as a sample
-        first_error = next((cat for cat in predicted_categories if "Error:" in str(cat)), "Unknown error")
-        logger.debug(f"Sample error from batch: {first_error}")
         return None # Indicates failure
+    if failed_count:
+        # The Batch API fails requests individually; only those tickets stay Pending
+        first_error = next(cat for cat in predicted_categories if "Error:" in str(cat))
+        logger.warning(f"{failed_count} of {batch_size} tickets failed categorization ({first_error}) and stay Pending.")
 
-    results = {ticket_id: category for ticket_id, category in zip(batch_ticket_ids, predicted_categories)}
+    results = {ticket_id: category for ticket_id, category in zip(batch_ticket_ids, predicted_categories)
+               if "Error:" not in str(category)}
     return results
 
 
 # --- Main Categorization Logic ---
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Categorize 'Pending' tickets with OpenAI.")
+    parser.add_argument(
+        "--batch-api", action="store_true",
+        help="Submit all pending tickets as one OpenAI Batch API job (cheaper, but may take up to 24h)."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY, metavar="N",
+        help=f"Number of batches categorized concurrently (default: {DEFAULT_CONCURRENCY})."
+    )
+    return parser.parse_args()
+
+def main(use_batch_api=False, concurrency=DEFAULT_CONCURRENCY):
     logger.info("="*30)
     logger.info("Starting ticket categorization process...")
     logger.info("="*30)
@@ -127,14 +183,8 @@ def main():
          logger.critical("Database engine is not initialized. Cannot run categorization. Exiting.")
          return
 
-    pending_df = get_pending_tickets()
-
-    if pending_df.empty:
-        logger.info("No pending tickets found to categorize. Exiting.")
-        return
-
     BATCH_SIZE = 10  # TESTING WITH SMALLER BATCH SIZE
-    DELAY_BETWEEN_BATCHES = 1 # Seconds
+    concurrency = max(1, concurrency)
 
     target_categories = [
         "Network Security", "Phishing Attack", "Malware Infection",
@@ -142,33 +192,61 @@ def main():
         "Hardware Issue", "Software Issue", "Other"
     ]
 
-    num_tickets = len(pending_df)
-    num_batches = (num_tickets + BATCH_SIZE - 1) // BATCH_SIZE
-    logger.info(f"Total tickets to process: {num_tickets}. Processing in {num_batches} batches of size up to {BATCH_SIZE}.")
+    # Batches are streamed from the database as they are categorized, so the
+    # totals are only known once the last batch has been fetched
+    batches = iter_pending_batches(BATCH_SIZE)
+    if use_batch_api:
+        # The Batch API takes one request per ticket, so everything goes in a single job
+        all_rows = list(chain.from_iterable(batches))
+        batches = [all_rows] if all_rows else []
+        logger.info("Using the OpenAI Batch API for this run.")
+    else:
+        logger.info(f"Processing pending tickets in batches of size up to {BATCH_SIZE}, {concurrency} at a time.")
 
     all_results = {}
     processed_count_from_api = 0 # Tickets for which we got a non-error response from API
     failed_api_batches = 0
-
-    for i in range(num_batches):
-        start_index = i * BATCH_SIZE
-        end_index = start_index + BATCH_SIZE
-        batch_df = pending_df.iloc[start_index:end_index]
-
-        logger.info(f"--- Starting Batch {i+1}/{num_batches} (Tickets {start_index+1}-{min(end_index, num_tickets)}) ---")
-
-        batch_results = process_batch(batch_df.copy(), target_categories) # Pass a copy to avoid SettingWithCopyWarning
-
+    num_tickets = 0
+    num_batches = 0
+    in_flight = {} # future -> batch number
+
+    def collect(future):
+        """Records the outcome of a finished batch."""
+        nonlocal processed_count_from_api, failed_api_batches
+        batch_number = in_flight.pop(future)
+        batch_results = future.result()
         if batch_results is None: # process_batch returns None on failure
-            logger.error(f"Batch {i+1} failed categorization processing.")
+            logger.error(f"Batch {batch_number} failed categorization processing.")
             failed_api_batches += 1
         else:
             all_results.update(batch_results)
             processed_count_from_api += len(batch_results) # Count successfully processed items in this batch
 
-        if i < num_batches - 1:
-            logger.info(f"Waiting {DELAY_BETWEEN_BATCHES}s before next batch...")
-            time.sleep(DELAY_BETWEEN_BATCHES)
+    # Batches overlap their API latency in worker threads. At most `concurrency`
+    # are in flight, so streaming from the database stays bounded. There is no
+    # fixed delay between batches: openai_agent's shared rate limiter paces
+    # requests to the account's RPM/TPM and pauses them all on a 429. Its
+    # OPENAI_MAX_CONCURRENCY cap applies per batch that fans out into several
+    # requests, so up to concurrency * OPENAI_MAX_CONCURRENCY can be in flight
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="categorize") as executor:
+        for i, batch_rows in enumerate(batches):
+            if len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+
+            num_batches += 1
+            logger.info(f"--- Starting Batch {i+1} (Tickets {num_tickets+1}-{num_tickets+len(batch_rows)}) ---")
+            num_tickets += len(batch_rows)
+            in_flight[executor.submit(process_batch, batch_rows, target_categories, use_batch_api=use_batch_api)] = i + 1
+
+        for future in as_completed(list(in_flight)):
+            collect(future)
+
+    if num_tickets == 0:
+        logger.info("No pending tickets found to categorize. Exiting.")
+        return
+    logger.info(f"Found {num_tickets} tickets with category 'Pending', NULL, or empty, in {num_batches} batches.")
 
     logger.info(f"--- Batch API processing finished. Successfully received API results for {processed_count_from_api} tickets. Failed API batches: {failed_api_batches} ---")
 
@@ -177,9 +255,8 @@ def main():
          return
 
     logger.info(f"Updating categories in the database for {len(all_results)} tickets with API results...")
-    db_update_success_count = 0
-    db_update_error_count = 0
     mapped_to_other_count = 0
+    final_categories = {}
 
     for ticket_id, predicted_category in all_results.items():
         final_category = predicted_category
@@ -187,11 +264,11 @@ def main():
              logger.warning(f"Category '{final_category}' for ticket ID {ticket_id} is not in target list. Remapping to 'Other'. This indicates an issue in categorize_ticket_batch logic.")
              final_category = 'Other'
              mapped_to_other_count += 1
-        
-        if update_ticket_category(ticket_id, final_category):
-            db_update_success_count += 1
-        else:
-            db_update_error_count += 1
+        final_categories[ticket_id] = final_category
+
+    # One round trip and one commit for the whole run instead of one per ticket
+    db_update_success_count = update_ticket_categories(final_categories)
+    db_update_error_count = len(final_categories) - db_update_success_count
 
     logger.info("-"*30)
     logger.info("Final Categorization Summary:")
@@ -204,4 +281,5 @@ def main():
     logger.info("-"*30)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(use_batch_api=args.batch_api, concurrency=args.concurrency)
\ No newline at end of file